@@ -0,0 +1,78 @@
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from openai import AsyncOpenAI
+from routes.llm_clients import get_openai_client, close_clients, HTTP2, MAX_CONNECTIONS
+from .common import report
+
+# 로컬 가짜 제공자를 띄우고 요청마다 새 SDK 클라이언트를 만드는 경우와 공유 클라이언트를 재사용하는 경우의 첫 토큰 시간 비교
+# 가짜 제공자는 TLS 없이 127.0.0.1에서 돌므로 실제 제공자보다 연결 비용(특히 TLS 핸드셰이크)이 작게 나옴
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=200)
+parser.add_argument("--concurrency", type=int, default=4)
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--tokens", type=int, default=20)
+parser.add_argument("--delay", type=float, default=0.01)
+args = parser.parse_args()
+
+BASE_URL = f"http://127.0.0.1:{args.port}/v1"
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+def wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("mock provider did not start")
+
+async def first_token(client) -> float:
+    start = time.perf_counter()
+    stream = await client.chat.completions.create(model="mock", messages=MESSAGES, stream=True)
+    ttft = None
+    async for chunk in stream:
+        if ttft is None and chunk.choices:
+            ttft = time.perf_counter() - start
+    return ttft
+
+async def run(fresh: bool) -> list:
+    samples = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            if fresh:
+                client = AsyncOpenAI(api_key="bench", base_url=BASE_URL)
+                try:
+                    samples.append(await first_token(client))
+                finally:
+                    await client.close()
+            else:
+                samples.append(await first_token(get_openai_client("bench", BASE_URL)))
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    return samples
+
+async def main():
+    # 첫 실행의 import/워밍업 비용이 비교에 섞이지 않도록 한 번씩 먼저 호출
+    await first_token(get_openai_client("bench", BASE_URL))
+    print(f"{args.requests} requests, concurrency {args.concurrency}, http2={HTTP2}, max_connections={MAX_CONNECTIONS}")
+    report("new client per request ttft", await run(fresh=True))
+    report("shared client ttft", await run(fresh=False))
+    await close_clients()
+
+provider = subprocess.Popen([
+    sys.executable, "-m", "bench.mock_provider",
+    "--port", str(args.port), "--tokens", str(args.tokens), "--delay", str(args.delay)
+])
+try:
+    wait_for_port(args.port)
+    asyncio.run(main())
+finally:
+    provider.terminate()
+    provider.wait()
@@ -0,0 +1,29 @@
+import asyncio
+from typing import List
+
+# 벤치마크 공통 도구: python -m bench.<이름> 으로 backend 디렉터리에서 실행
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+# 초 단위 샘플을 ms로 출력
+def report(name: str, samples: List[float]):
+    print(
+        f"{name}: n={len(samples)} "
+        f"p50={percentile(samples, 50) * 1000:.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:.2f}ms "
+        f"max={max(samples, default=0.0) * 1000:.2f}ms"
+    )
+
+# interval마다 토큰 하나를 받는 채팅 스트림 흉내, 실제 도착 간격을 gaps에 기록
+async def token_stream(count: int, interval: float, gaps: List[float]):
+    loop = asyncio.get_running_loop()
+    last = loop.time()
+    for _ in range(count):
+        await asyncio.sleep(interval)
+        now = loop.time()
+        gaps.append(now - last)
+        last = now
@@ -0,0 +1,76 @@
+import os
+import time
+import shutil
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from routes.extraction import run_extraction, text_cache, shutdown_extraction, EXTRACTION_WORKERS
+from routes.extractors import extract_document_path
+from .common import report
+
+# 문서 묶음(corpus)에 대해 프로세스 풀 추출 시간과 같은 파일을 다시 보낼 때(해시 + 캐시 조회)의 비용 측정
+# 디렉터리를 주지 않으면 PyMuPDF로 여러 쪽수의 예제 PDF를 만들어 사용
+# python -m bench.extraction [--corpus DIR]
+parser = argparse.ArgumentParser()
+parser.add_argument("--corpus", default=None)
+parser.add_argument("--pages", default="1,10,50,200")
+args = parser.parse_args()
+
+def build_corpus(path: str, page_counts):
+    import pymupdf
+    for pages in page_counts:
+        document = pymupdf.open()
+        for number in range(pages):
+            page = document.new_page()
+            page.insert_textbox(page.rect + (72, 72, -72, -72), f"Page {number + 1}\n" + "벤치마크 문서 본문입니다. " * 60, fontname="korea")
+        document.save(os.path.join(path, f"sample_{pages}p.pdf"))
+        document.close()
+
+async def main():
+    corpus = args.corpus
+    generated = corpus is None
+    if generated:
+        corpus = tempfile.mkdtemp(prefix="extraction-bench-")
+        build_corpus(corpus, [int(p) for p in args.pages.split(",")])
+    names = sorted(os.listdir(corpus))
+    try:
+        # 워커 프로세스 시작(spawn) 비용은 따로 측정
+        start = time.perf_counter()
+        await asyncio.gather(*(run_extraction(extract_document_path, os.path.join(corpus, names[0]), names[0]) for _ in range(EXTRACTION_WORKERS)))
+        print(f"pool warm-up: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        cold = []
+        total_start = time.perf_counter()
+
+        async def extract(name: str):
+            path = os.path.join(corpus, name)
+            start = time.perf_counter()
+            text = await run_extraction(extract_document_path, path, name)
+            elapsed = time.perf_counter() - start
+            cold.append(elapsed)
+            with open(path, "rb") as f:
+                text_cache[hashlib.sha256(f.read()).hexdigest()] = text
+            print(f"  {name}: {os.path.getsize(path) / 1024:.0f}KB -> {len(text)} chars in {elapsed * 1000:.0f}ms")
+
+        await asyncio.gather(*(extract(name) for name in names))
+        print(f"{len(names)} files with {EXTRACTION_WORKERS} workers in {time.perf_counter() - total_start:.2f}s")
+        report("cold extraction", cold)
+
+        # 다시 보낸 파일: 바이트 해시 + 캐시 조회만
+        cached = []
+        for name in names:
+            with open(os.path.join(corpus, name), "rb") as f:
+                data = f.read()
+            start = time.perf_counter()
+            hit = text_cache.get(hashlib.sha256(data).hexdigest())
+            cached.append(time.perf_counter() - start)
+            assert hit is not None
+        report("cache hit", cached)
+    finally:
+        shutdown_extraction()
+        if generated:
+            shutil.rmtree(corpus)
+
+if __name__ == "__main__":
+    asyncio.run(main())
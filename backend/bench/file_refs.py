@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import uuid
+import base64
+import argparse
+import bson
+from routes.chat import ChatRequest
+from routes.extraction import format_file_text
+from .common import report
+
+# 문서를 base64 data-URL로 매 요청에 싣는 경우와 /files의 file_id로 참조하는 경우 비교
+# 요청 본문 크기/ChatRequest 파싱 시간, 저장되는 대화 문서 크기/BSON 변환 시간(Mongo 읽기/쓰기 비용 대용)
+parser = argparse.ArgumentParser()
+parser.add_argument("--file-kb", type=int, default=1024)
+parser.add_argument("--text-kb", type=int, default=200)
+parser.add_argument("--turns", type=int, default=20)
+parser.add_argument("--repeat", type=int, default=50)
+args = parser.parse_args()
+
+FILE_DATA = os.urandom(args.file_kb * 1024)
+TEXT = "추출된 문서 텍스트 " * (args.text_kb * 1024 // 27)
+FILE_ID = uuid.uuid4().hex
+
+def request_body(inline: bool) -> bytes:
+    if inline:
+        part = {"type": "file", "name": "report.pdf", "content": "data:application/pdf;base64," + base64.b64encode(FILE_DATA).decode()}
+    else:
+        part = {"type": "file", "name": "report.pdf", "file_id": FILE_ID}
+    return json.dumps({
+        "conversation_id": "bench",
+        "model": "gpt-4o",
+        "in_billing": 2.5,
+        "out_billing": 10,
+        "user_message": [{"type": "text", "text": "이 문서를 요약해줘"}, part]
+    }).encode()
+
+# 매 턴 문서를 첨부한 대화: 예전에는 추출 텍스트를 메시지에 그대로 저장
+def conversation_doc(inline: bool) -> dict:
+    messages = []
+    for _ in range(args.turns):
+        if inline:
+            part = {"type": "file", "name": "report.pdf", "content": format_file_text("report.pdf", TEXT)}
+        else:
+            part = {"type": "file", "name": "report.pdf", "file_id": FILE_ID}
+        messages.append({"role": "user", "content": [{"type": "text", "text": "다음 문서"}, part]})
+        messages.append({"role": "assistant", "content": "요약 " * 200})
+    return {"user_id": "bench", "conversation_id": "bench", "conversation": messages}
+
+def timed(func, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+for inline in (True, False):
+    label = "base64 inline" if inline else "file_id"
+    body = request_body(inline)
+    doc = conversation_doc(inline)
+    encoded = bson.encode(doc)
+    print(f"{label}: request {len(body) / 1024:.1f}KB, conversation document {len(encoded) / 1024:.1f}KB ({args.turns} turns)")
+    report(f"  {label} request parse", timed(lambda: ChatRequest.model_validate_json(body), args.repeat))
+    report(f"  {label} document encode", timed(lambda: bson.encode(doc), args.repeat))
+    report(f"  {label} document decode", timed(lambda: bson.decode(encoded), args.repeat))
@@ -0,0 +1,80 @@
+import os
+import copy
+import time
+import base64
+import shutil
+import asyncio
+import argparse
+from routes.images import UPLOAD_DIR, image_path, payload_cache, warm_images
+from routes.chat import providers
+from .common import report
+
+# 히스토리의 이미지 수에 따른 턴당 메시지 준비 시간 비교
+# 예전: 매 턴 모든 이미지를 읽어 base64 인코딩한 뒤 deepcopy / 지금: warm_images + 인코딩 캐시 (첫 턴과 이후 턴)
+parser = argparse.ArgumentParser()
+parser.add_argument("--counts", default="0,1,5,10,20")
+parser.add_argument("--image-kb", type=int, default=150)
+parser.add_argument("--repeat", type=int, default=20)
+args = parser.parse_args()
+
+BENCH_DIR = os.path.join(UPLOAD_DIR, "bench")
+
+def build_history(count: int):
+    messages = []
+    for index in range(count):
+        path = f"/images/bench/{index}.jpeg"
+        with open(image_path(path), "wb") as f:
+            f.write(os.urandom(args.image_kb * 1024))
+        messages.append({"role": "user", "content": [{"type": "text", "text": "이 사진"}, {"type": "image", "name": f"{index}.jpeg", "content": path}]})
+        messages.append({"role": "assistant", "content": "사진 설명 " * 50})
+    return messages
+
+# 예전 openai_client.format_message + copy.deepcopy 방식
+def legacy_prepare(messages):
+    def normalize_content(part):
+        if part.get("type") == "image":
+            with open(image_path(part["content"]), "rb") as f:
+                data = "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("utf-8")
+            return {"type": "image_url", "image_url": {"url": data}}
+        return part
+
+    return [
+        copy.deepcopy({**message, "content": [normalize_content(part) for part in message["content"]]} if message["role"] == "user" else message)
+        for message in messages
+    ]
+
+async def prepare(adapter, messages):
+    await warm_images(messages, data_url=adapter.data_url)
+    return [adapter.format_message(message) for message in messages]
+
+async def main():
+    adapter = providers["gpt"]
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    try:
+        for count in [int(c) for c in args.counts.split(",")]:
+            messages = build_history(count)
+            legacy = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                legacy_prepare(messages)
+                legacy.append(time.perf_counter() - start)
+
+            payload_cache.clear()
+            start = time.perf_counter()
+            await prepare(adapter, messages)
+            first = time.perf_counter() - start
+
+            cached = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                await prepare(adapter, messages)
+                cached.append(time.perf_counter() - start)
+
+            print(f"{count} images ({args.image_kb}KB each): first turn {first * 1000:.2f}ms")
+            report("  legacy per turn", legacy)
+            report("  cached per turn", cached)
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
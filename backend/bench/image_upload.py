@@ -0,0 +1,76 @@
+import io
+import time
+import asyncio
+import argparse
+from fastapi import HTTPException
+from PIL import Image
+from routes.images import convert_image, image_executor, IMAGE_WORKERS
+from routes.image_processing import process_image
+from .common import report, token_stream
+
+# 12MP 사진 묶음을 업로드할 때 이미지당 변환 지연(p50/p99)과 처리량(장/초), 그동안의 토큰 도착 간격 측정
+# --inline: 예전처럼 이벤트 루프에서 바로 process_image 실행 (비교용)
+# python -m bench.image_upload [--images 12] [--inline]
+parser = argparse.ArgumentParser()
+parser.add_argument("--images", type=int, default=12)
+parser.add_argument("--width", type=int, default=4000)
+parser.add_argument("--height", type=int, default=3000)
+parser.add_argument("--streams", type=int, default=20)
+parser.add_argument("--interval", type=float, default=0.02)
+parser.add_argument("--inline", action="store_true")
+args = parser.parse_args()
+
+# 카메라 사진과 비슷한 크기가 나오도록 저해상도 노이즈를 키운 JPEG
+def build_photo(seed: int) -> bytes:
+    size = (args.width // 8, args.height // 8)
+    channels = [Image.effect_noise(size, 40 + seed % 20 + index * 10).resize((args.width, args.height), Image.Resampling.BICUBIC) for index in range(3)]
+    buffer = io.BytesIO()
+    Image.merge("RGB", channels).save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+async def main():
+    photos = [build_photo(seed) for seed in range(args.images)]
+    print(f"{len(photos)} photos of {args.width}x{args.height}, {sum(map(len, photos)) / len(photos) / 1024 / 1024:.1f}MB each on average")
+
+    if not args.inline:
+        # 워커 프로세스 시작(spawn) 비용은 따로 측정
+        start = time.perf_counter()
+        await asyncio.gather(*(convert_image(photos[0]) for _ in range(IMAGE_WORKERS)))
+        print(f"pool warm-up: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    gaps = []
+    latencies = []
+    rejected = 0
+
+    # 지연은 묶음을 보낸 시점부터 변환이 끝날 때까지 (inline은 앞 이미지를 기다린 시간 포함)
+    async def upload(contents: bytes, start: float):
+        nonlocal rejected
+        try:
+            if args.inline:
+                process_image(contents)
+            else:
+                await convert_image(contents)
+        except HTTPException:
+            rejected += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    tokens = int((2 + args.images * 1.0) / args.interval)
+    streams = [asyncio.create_task(token_stream(tokens, args.interval, gaps)) for _ in range(args.streams)]
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(contents, start) for contents in photos))
+    elapsed = time.perf_counter() - start
+    # 막혀 있던 스트림이 깨어나 그 간격을 기록할 시간
+    await asyncio.sleep(0.5)
+    for stream in streams:
+        stream.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    image_executor.shutdown()
+
+    print(f"{'inline' if args.inline else f'{IMAGE_WORKERS} workers'}: {len(latencies)} images in {elapsed:.2f}s ({len(latencies) / elapsed:.2f}/s), {rejected} rejected")
+    report("image", latencies)
+    report("token inter-arrival", gaps)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+import time
+import asyncio
+import argparse
+from fastapi import HTTPException
+from routes.auth import hash_password, verify_password, run_password_job, password_executor, BCRYPT_ROUNDS, PASSWORD_WORKERS
+from .common import report, token_stream
+
+# 채팅 스트림이 도는 동안 로그인(bcrypt 검증)이 몰릴 때 로그인 처리량과 토큰 도착 간격 p99 측정
+# --inline: 예전처럼 이벤트 루프에서 바로 bcrypt 실행 (비교용)
+parser = argparse.ArgumentParser()
+parser.add_argument("--streams", type=int, default=100)
+parser.add_argument("--interval", type=float, default=0.02)
+parser.add_argument("--logins", type=int, default=50)
+parser.add_argument("--inline", action="store_true")
+args = parser.parse_args()
+
+PASSWORD = "bench-password"
+
+async def main():
+    hashed = hash_password(PASSWORD)
+    gaps = []
+    login_times = []
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        start = time.perf_counter()
+        try:
+            if args.inline:
+                verify_password(PASSWORD, hashed)
+            else:
+                await run_password_job(verify_password, PASSWORD, hashed)
+        except HTTPException:
+            rejected += 1
+            return
+        login_times.append(time.perf_counter() - start)
+
+    async def burst():
+        await asyncio.sleep(0.2)
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+        return time.perf_counter() - start
+
+    # 로그인 폭주가 끝날 때까지 스트림이 이어지도록 넉넉히 잡고 끝나면 취소
+    tokens = int((1 + args.logins * 0.5) / args.interval)
+    streams = [asyncio.create_task(token_stream(tokens, args.interval, gaps)) for _ in range(args.streams)]
+    elapsed = await burst()
+    # 막혀 있던 스트림이 깨어나 그 간격을 기록할 시간
+    await asyncio.sleep(0.5)
+    for stream in streams:
+        stream.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    password_executor.shutdown()
+
+    print(f"bcrypt rounds {BCRYPT_ROUNDS}, {'inline' if args.inline else f'{PASSWORD_WORKERS} workers'}: {len(login_times)} logins in {elapsed:.2f}s ({len(login_times) / elapsed:.1f}/s), {rejected} rejected")
+    report("login", login_times)
+    report("token inter-arrival", gaps)
+
+asyncio.run(main())
@@ -0,0 +1,91 @@
+import json
+import asyncio
+import argparse
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+# 벤치마크/테스트용 로컬 가짜 제공자: OpenAI 호환 /v1/chat/completions, Anthropic /v1/messages 스트리밍 응답
+# 받은 요청 본문(bytes)은 app.state.requests에 순서대로 보관
+# python -m bench.mock_provider --port 8765 --tokens 50 --delay 0.01
+parser = argparse.ArgumentParser()
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--tokens", type=int, default=50)
+parser.add_argument("--delay", type=float, default=0.0)
+parser.add_argument("--ttft", type=float, default=0.0)
+
+def completion_chunk(model: str, delta: dict, usage: dict = None) -> str:
+    chunk = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": model,
+        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": None}],
+    }
+    if usage:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk)}\n\n"
+
+def anthropic_event(payload: dict) -> str:
+    return f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+
+def build_app(tokens: int = 50, delay: float = 0.0, ttft: float = 0.0) -> Starlette:
+    async def chat_completions(request: Request):
+        raw = await request.body()
+        request.app.state.requests.append(raw)
+        model = json.loads(raw).get("model", "mock")
+
+        async def events():
+            await asyncio.sleep(ttft)
+            for i in range(tokens):
+                if i and delay:
+                    await asyncio.sleep(delay)
+                yield completion_chunk(model, {"content": f"tok{i} "})
+            yield completion_chunk(model, {}, {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def messages(request: Request):
+        raw = await request.body()
+        request.app.state.requests.append(raw)
+        model = json.loads(raw).get("model", "mock")
+
+        async def events():
+            await asyncio.sleep(ttft)
+            yield anthropic_event({
+                "type": "message_start",
+                "message": {
+                    "id": "msg_bench",
+                    "type": "message",
+                    "role": "assistant",
+                    "content": [],
+                    "model": model,
+                    "stop_reason": None,
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": 10, "output_tokens": 1, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+                }
+            })
+            yield anthropic_event({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            for i in range(tokens):
+                if i and delay:
+                    await asyncio.sleep(delay)
+                yield anthropic_event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": f"tok{i} "}})
+            yield anthropic_event({"type": "content_block_stop", "index": 0})
+            yield anthropic_event({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": tokens}})
+            yield anthropic_event({"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app = Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/messages", messages, methods=["POST"]),
+    ])
+    app.state.requests = []
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+    args = parser.parse_args()
+    uvicorn.run(build_app(args.tokens, args.delay, args.ttft), host="127.0.0.1", port=args.port, log_level="warning")
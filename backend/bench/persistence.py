@@ -0,0 +1,61 @@
+import os
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from pymongo import MongoClient
+from routes.database import append_messages, conversation_collection
+from .common import report, token_stream
+
+# 동시 스트림들이 끝나는 대로 대화를 저장하는 동안 다른 스트림의 토큰 도착 간격이 유지되는지 측정
+# MONGODB_URI의 chat_db에 bench- 사용자로 쓰고 끝나면 지움
+# --blocking: 예전처럼 동기 pymongo로 이벤트 루프에서 저장 (비교용)
+parser = argparse.ArgumentParser()
+parser.add_argument("--streams", type=int, default=200)
+parser.add_argument("--tokens", type=int, default=100)
+parser.add_argument("--interval", type=float, default=0.02)
+parser.add_argument("--blocking", action="store_true")
+args = parser.parse_args()
+
+USER_ID = f"bench-{uuid.uuid4().hex}"
+
+def turn_messages():
+    return [
+        {"role": "user", "content": [{"type": "text", "text": "질문 " * 50}], "tokens": 50},
+        {"role": "assistant", "content": "답변 " * 400, "tokens": 400}
+    ]
+
+async def main():
+    gaps = []
+    write_times = []
+    sync_collection = MongoClient(os.getenv('MONGODB_URI')).chat_db.conversations if args.blocking else None
+
+    async def persist(conversation_id: str):
+        start = time.perf_counter()
+        if sync_collection is not None:
+            sync_collection.update_one(
+                {"user_id": USER_ID, "conversation_id": conversation_id},
+                {"$push": {"conversation": {"$each": turn_messages()}}},
+                upsert=True
+            )
+        else:
+            await append_messages(USER_ID, conversation_id, turn_messages(), {"model": "bench"})
+        write_times.append(time.perf_counter() - start)
+
+    # 시작 시점을 흩어서 저장이 다른 스트림의 스트리밍과 겹치게 함
+    async def run_stream(index: int):
+        await asyncio.sleep(random.uniform(0, args.tokens * args.interval))
+        await token_stream(args.tokens, args.interval, gaps)
+        await persist(f"bench-{index}")
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_stream(i) for i in range(args.streams)))
+    finally:
+        await conversation_collection.delete_many({"user_id": USER_ID})
+    print(f"{args.streams} streams x {args.tokens} tokens, interval {args.interval * 1000:.0f}ms, {'blocking pymongo' if args.blocking else 'motor'}: {time.perf_counter() - start:.2f}s")
+    report("token inter-arrival", gaps)
+    report("persist", write_times)
+
+asyncio.run(main())
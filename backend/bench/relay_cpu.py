@@ -0,0 +1,98 @@
+import json
+import time
+import asyncio
+import argparse
+from starlette.requests import Request
+from routes.streaming import coalesce, sse_frame, COALESCE_WINDOW
+from routes.generations import Generation, chunk_payload
+
+# SSE 중계의 CPU 비용(1k 토큰당) 비교
+# 예전: 토큰마다 asyncio.Queue 경유 + is_disconnected() 두 번 + 토큰마다 한 프레임 + 문자열 +=
+# 지금: coalesce로 직접 순회 + 생성 버퍼 + 프레임마다 sse_frame(id 포함)
+# 제공자 스트림만 돌린 CPU를 빼서 중계 자체의 비용만 계산
+parser = argparse.ArgumentParser()
+parser.add_argument("--streams", type=int, default=200)
+parser.add_argument("--tokens", type=int, default=500)
+parser.add_argument("--interval", type=float, default=0.005)
+args = parser.parse_args()
+
+async def provider_stream():
+    for index in range(args.tokens):
+        await asyncio.sleep(args.interval)
+        yield f"tok{index} "
+
+# 실제 Starlette Request: is_disconnected()가 매번 receive를 열고 취소하는 경로를 그대로 탐
+def connected_request() -> Request:
+    never = asyncio.Event()
+
+    async def receive():
+        await never.wait()
+
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+async def source_only() -> int:
+    count = 0
+    async for _ in provider_stream():
+        count += 1
+    return count
+
+async def legacy_relay() -> int:
+    request = connected_request()
+    token_queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce_tokens():
+        async for token in provider_stream():
+            if await request.is_disconnected():
+                return
+            await token_queue.put(token)
+        await token_queue.put(None)
+
+    producer = asyncio.create_task(produce_tokens())
+    response_text = ""
+    frames = 0
+    while True:
+        token = await token_queue.get()
+        if token is None:
+            break
+        if await request.is_disconnected():
+            break
+        response_text += token
+        frame = f"data: {json.dumps({'content': token})}\n\n"
+        frames += 1
+    await producer
+    return frames
+
+async def current_relay() -> int:
+    generation = Generation("bench", "bench")
+    response_chunks = []
+
+    async def produce():
+        async for text in coalesce(provider_stream()):
+            response_chunks.append(text)
+            generation.append(text)
+        generation.finish()
+
+    producer = asyncio.create_task(produce())
+    frames = 0
+    async for seq, chunk in generation.events(0):
+        frame = sse_frame(chunk_payload(chunk), seq)
+        frames += 1
+    await producer
+    "".join(response_chunks)
+    return frames
+
+async def measure(relay):
+    start = time.process_time()
+    results = await asyncio.gather(*(relay() for _ in range(args.streams)))
+    return time.process_time() - start, sum(results)
+
+async def main():
+    total_tokens = args.streams * args.tokens
+    print(f"{args.streams} streams x {args.tokens} tokens, {args.interval * 1000:.0f}ms per token, coalesce window {COALESCE_WINDOW * 1000:.0f}ms")
+    base_cpu, _ = await measure(source_only)
+    for name, relay in (("legacy", legacy_relay), ("current", current_relay)):
+        cpu, frames = await measure(relay)
+        print(f"{name}: {(cpu - base_cpu) / total_tokens * 1000 * 1000:.1f}ms CPU per 1k tokens, {frames} frames ({frames / total_tokens:.2f} per token)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
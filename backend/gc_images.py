@@ -0,0 +1,6 @@
+import asyncio
+from routes.database import conversation_collection
+from routes.images import collect_garbage
+
+# 대화에서 더 이상 참조하지 않는 이미지 정리
+print(f"Removed {asyncio.run(collect_garbage(conversation_collection))} files")
@@ -1,15 +1,33 @@
 import os
-import io
-import uuid
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from PIL import Image, ImageOps
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from routes import auth, conversations, openai_client, anthropic_client
+from routes.auth import User, get_current_user_claims
+from routes import auth, conversations, chat, summary, generations, response_cache, aliases, database, metrics, billing, llm_clients, extraction, images
 
 load_dotenv()
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.migrate_conversations()
+    await database.ensure_indexes()
+    await generations.ensure_generation_indexes()
+    await response_cache.ensure_response_cache_indexes()
+    billing.billing_batcher.start()
+    llm_clients.init_clients()
+    aliases.alias_queue.start()
+    yield
+    await aliases.alias_queue.stop()
+    await generations.shutdown_generations()
+    await summary.shutdown_summaries()
+    await billing.billing_batcher.stop()
+    await llm_clients.close_clients()
+    extraction.shutdown_extraction()
+    images.shutdown_images()
+    auth.password_executor.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,55 +38,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Generation-ID"],
 )
 
-app.mount("/images", StaticFiles(directory="images"), name="images")
+app.mount("/images", images.ImmutableStaticFiles(directory=images.UPLOAD_DIR), name="images")
 
 app.include_router(auth.router)
 app.include_router(conversations.router)
-app.include_router(openai_client.router)
-app.include_router(anthropic_client.router)
+app.include_router(chat.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Service is Running"}
 
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "images")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 @app.post("/upload")
 async def upload_image(file: UploadFile = File(...)):
-    contents = await file.read()
+    contents = await images.read_upload(file, images.MAX_IMAGE_SIZE)
 
     try:
-        image = Image.open(io.BytesIO(contents))
+        paths = await images.store_image(contents)
+    except HTTPException:
+        raise
     except Exception:
         return {"error": "Can't Read Image File"}
 
-    image = ImageOps.exif_transpose(image)
-
-    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
-        if image.mode != "RGBA":
-            image = image.convert("RGBA")
-        background = Image.new("RGB", image.size, (255, 255, 255))
-        background.paste(image, mask=image.split()[3])
-        image = background
-    else:
-        image = image.convert("RGB")
-
-    max_dimension = (1024, 1024)
-    image.thumbnail(max_dimension, Image.Resampling.LANCZOS)
-
-    buffer = io.BytesIO()
-    image.save(buffer, format="JPEG", quality=60, optimize=True)
-    
-    new_filename = f"{uuid.uuid4().hex}.jpeg"
-    file_location = os.path.join(UPLOAD_DIR, new_filename)
-    with open(file_location, "wb") as f:
-        f.write(buffer.getvalue())
+    return {
+        "info": "File Successfully Uploaded",
+        "file_name": os.path.basename(paths["jpeg"]),
+        "file_path": paths["jpeg"],
+        "thumbnail_path": paths["thumb"],
+        "webp_path": paths["webp"]
+    }
 
+@app.post("/files")
+async def upload_file(file: UploadFile = File(...), user: User = Depends(get_current_user_claims)):
+    meta = await extraction.save_file(file, user.user_id)
     return {
         "info": "File Successfully Uploaded",
-        "file_name": new_filename,
-        "file_path": f"/images/{new_filename}"
+        "file_id": meta["_id"],
+        "file_name": meta["name"],
+        "size": meta["size"]
     }
\ No newline at end of file
@@ -0,0 +1,202 @@
+import os
+import time
+import random
+import asyncio
+from collections import defaultdict, deque
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from .metrics import increment
+from .model_registry import ModelInfo, get_model_info
+from .llm_clients import is_transient_error, retry_after
+
+load_dotenv()
+
+# 입장 제어 설정
+USER_MAX_STREAMS = int(os.getenv('USER_MAX_STREAMS', '3'))
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', '30'))
+ADMISSION_QUEUE_LIMIT = int(os.getenv('ADMISSION_QUEUE_LIMIT', '100'))
+# 첫 토큰 전 일시적 오류(429, 5xx, 연결 오류) 재시도
+PROVIDER_RETRIES = int(os.getenv('PROVIDER_RETRIES', '2'))
+PROVIDER_RETRY_DELAY = float(os.getenv('PROVIDER_RETRY_DELAY', '0.5'))
+PROVIDER_RETRY_MAX_DELAY = float(os.getenv('PROVIDER_RETRY_MAX_DELAY', '8'))
+
+class AdmissionTimeout(Exception):
+    pass
+
+# 사용자별 동시 스트림 수 (워커 단위)
+class UserStreamLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active: Dict[str, int] = defaultdict(int)
+
+    def acquire(self, user_id: str):
+        if self.limit and self.active[user_id] >= self.limit:
+            increment("admission_user_rejections")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="동시에 진행 중인 응답이 너무 많습니다"
+            )
+        self.active[user_id] += 1
+
+    def release(self, user_id: str):
+        self.active[user_id] -= 1
+        if self.active[user_id] <= 0:
+            del self.active[user_id]
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # amount만큼 쓸 수 있을 때까지 남은 시간 (용량보다 큰 요청은 가득 찼을 때 허용)
+    def wait_time(self, amount: float) -> float:
+        self.refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class Waiter:
+    def __init__(self, user_id: str, tokens: int):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.future = asyncio.get_running_loop().create_future()
+
+# 모델별 요청/토큰 버킷과 사용자 간 라운드 로빈 대기열
+class ProviderLane:
+    def __init__(self, info: ModelInfo):
+        self.request_bucket = TokenBucket(info.requests_per_minute) if info.requests_per_minute else None
+        self.token_bucket = TokenBucket(info.tokens_per_minute) if info.tokens_per_minute else None
+        self.queues: Dict[str, Deque[Waiter]] = {}
+        self.order: Deque[str] = deque()
+        self.size = 0
+        self.dispatcher: Optional[asyncio.Task] = None
+
+    def wait_time(self, tokens: int) -> float:
+        waits = [0.0]
+        if self.request_bucket:
+            waits.append(self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            waits.append(self.token_bucket.wait_time(tokens))
+        return max(waits)
+
+    def consume(self, tokens: int):
+        if self.request_bucket:
+            self.request_bucket.consume(1)
+        if self.token_bucket:
+            self.token_bucket.consume(tokens)
+
+    # 각 사용자 대기열에서 한 명씩 번갈아 꺼낸다고 볼 때의 순번 (1부터)
+    def position(self, waiter: Waiter) -> int:
+        queue = self.queues.get(waiter.user_id)
+        if not queue or waiter not in queue:
+            return 0
+        rank = queue.index(waiter)
+        user_index = self.order.index(waiter.user_id)
+        ahead = 0
+        for index, user_id in enumerate(self.order):
+            length = len(self.queues[user_id])
+            ahead += min(length, rank + 1 if index < user_index else rank)
+        return ahead + 1
+
+    def enqueue(self, waiter: Waiter):
+        if waiter.user_id not in self.queues:
+            self.queues[waiter.user_id] = deque()
+            self.order.append(waiter.user_id)
+        self.queues[waiter.user_id].append(waiter)
+        self.size += 1
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self.dispatch())
+
+    def remove(self, waiter: Waiter):
+        queue = self.queues.get(waiter.user_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self.size -= 1
+            if not queue:
+                del self.queues[waiter.user_id]
+                self.order.remove(waiter.user_id)
+
+    async def dispatch(self):
+        while self.order:
+            user_id = self.order[0]
+            waiter = self.queues[user_id][0]
+            delay = self.wait_time(waiter.tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.consume(waiter.tokens)
+            self.remove(waiter)
+            if user_id in self.queues:
+                self.order.rotate(-1)
+            if not waiter.future.done():
+                waiter.future.set_result(True)
+
+    # 대기 중에는 순번을 내보내고, 허용되면 끝남 (ADMISSION_MAX_WAIT을 넘기면 AdmissionTimeout)
+    async def admit(self, user_id: str, tokens: int) -> AsyncIterator[int]:
+        if not self.order and self.wait_time(tokens) == 0:
+            self.consume(tokens)
+            return
+        if self.size >= ADMISSION_QUEUE_LIMIT:
+            increment("admission_queue_full")
+            raise AdmissionTimeout("서버가 혼잡합니다. 잠시 후 다시 시도해 주세요")
+        waiter = Waiter(user_id, tokens)
+        self.enqueue(waiter)
+        increment("admission_queued")
+        deadline = time.monotonic() + ADMISSION_MAX_WAIT
+        last_position = 0
+        try:
+            while not waiter.future.done():
+                position = self.position(waiter)
+                if position and position != last_position:
+                    last_position = position
+                    yield position
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    increment("admission_timeouts")
+                    raise AdmissionTimeout("대기 시간이 초과되었습니다. 잠시 후 다시 시도해 주세요")
+                await asyncio.wait((waiter.future,), timeout=min(remaining, 1.0))
+        finally:
+            self.remove(waiter)
+
+lanes: Dict[Tuple[str, str], ProviderLane] = {}
+user_limiter = UserStreamLimiter(USER_MAX_STREAMS)
+
+def get_lane(provider: str, model: str) -> ProviderLane:
+    key = (provider, model.split(':')[0])
+    lane = lanes.get(key)
+    if lane is None:
+        lane = lanes[key] = ProviderLane(get_model_info(model))
+    return lane
+
+def retry_delay(attempt: int, ex: Exception) -> float:
+    delay = retry_after(ex)
+    if delay is None:
+        delay = PROVIDER_RETRY_DELAY * 2 ** attempt * (1 + random.random() / 2)
+    return min(delay, PROVIDER_RETRY_MAX_DELAY)
+
+# 첫 토큰을 받기 전 일시적 오류만 재시도 (이미 보낸 내용이 있으면 그대로 실패)
+async def stream_with_retry(open_stream) -> AsyncIterator[str]:
+    attempt = 0
+    while True:
+        started = False
+        try:
+            async for text in open_stream():
+                started = True
+                yield text
+            return
+        except Exception as ex:
+            if started or attempt >= PROVIDER_RETRIES or not is_transient_error(ex):
+                raise
+            increment("provider_retries")
+            await asyncio.sleep(retry_delay(attempt, ex))
+            attempt += 1
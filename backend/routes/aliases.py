@@ -0,0 +1,123 @@
+import os
+import asyncio
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Tuple
+from .database import conversation_collection, DEFAULT_ALIAS
+from .metrics import increment
+from .openai_client import get_alias
+
+load_dotenv()
+
+# 별칭 생성 큐 설정
+ALIAS_WORKERS = int(os.getenv('ALIAS_WORKERS', '4'))
+ALIAS_QUEUE_SIZE = int(os.getenv('ALIAS_QUEUE_SIZE', '1000'))
+ALIAS_RETRIES = int(os.getenv('ALIAS_RETRIES', '3'))
+ALIAS_RETRY_DELAY = float(os.getenv('ALIAS_RETRY_DELAY', '1'))
+
+# 사용자가 먼저 이름을 바꿨으면 그 이름을 유지, 저장된 별칭을 반환
+async def save_alias(user_id: str, conversation_id: str, alias: Optional[str]) -> Optional[str]:
+    stages: List[Dict[str, Any]] = [{"$unset": "alias_pending"}]
+    if alias:
+        stages.insert(0, {"$set": {"alias": {"$cond": [{"$eq": ["$alias", DEFAULT_ALIAS]}, {"$literal": alias}, "$alias"]}}})
+    doc = await conversation_collection.find_one_and_update(
+        {"user_id": user_id, "conversation_id": conversation_id},
+        stages,
+        projection={"alias": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return doc.get("alias") if doc else None
+
+# /new_conversation 응답을 기다리게 하지 않도록 별칭은 백그라운드 워커가 생성
+class AliasQueue:
+    def __init__(self, workers: int, maxsize: int):
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.tasks: List[asyncio.Task] = []
+        # (user_id, conversation_id) -> 생성 중인 별칭, 완료된 별칭은 잠시 보관
+        self.pending: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.recent: TTLCache = TTLCache(maxsize=4096, ttl=300)
+
+    def submit(self, user_id: str, conversation_id: str, user_message: str) -> bool:
+        key = (user_id, conversation_id)
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((key, user_message, future))
+        except asyncio.QueueFull:
+            increment("alias_dropped")
+            return False
+        self.pending[key] = future
+        return True
+
+    async def generate(self, user_message: str) -> Optional[str]:
+        for attempt in range(ALIAS_RETRIES):
+            try:
+                alias = (await get_alias(user_message) or "").strip()
+                return alias or None
+            except Exception as ex:
+                print(f"Alias generation exception: {ex}", flush=True)
+                increment("alias_retries")
+                if attempt + 1 < ALIAS_RETRIES:
+                    await asyncio.sleep(ALIAS_RETRY_DELAY * 2 ** attempt)
+        return None
+
+    async def worker(self):
+        while True:
+            key, user_message, future = await self.queue.get()
+            alias = None
+            try:
+                generated = await self.generate(user_message)
+                # 그사이 사용자가 이름을 바꿨으면 생성된 별칭은 알리지 않음
+                if await save_alias(*key, generated) == generated:
+                    alias = generated
+                increment("aliases_generated" if generated else "alias_failures")
+            except Exception as ex:
+                print(f"Alias save exception: {ex}", flush=True)
+            finally:
+                self.pending.pop(key, None)
+                if alias:
+                    self.recent[key] = alias
+                if not future.done():
+                    future.set_result(alias)
+                self.queue.task_done()
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    # 생성 중이면 완료될 때까지(최대 timeout) 기다림, 이 워커에서 만든 별칭이 아니면 None
+    async def wait(self, user_id: str, conversation_id: str, timeout: float) -> Optional[str]:
+        key = (user_id, conversation_id)
+        if key in self.recent:
+            return self.recent[key]
+        future = self.pending.get(key)
+        if future is None or timeout <= 0:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    # 사용자가 이름을 바꾸면 보관 중인 생성 별칭을 버림
+    def forget(self, user_id: str, conversation_id: str):
+        self.recent.pop((user_id, conversation_id), None)
+
+    # 생성 중인 별칭이 있을 때만(첫 턴) 같은 워커의 채팅 스트림에 {"alias": ...} 이벤트를 넣음
+    def watch(self, user_id: str, conversation_id: str, generation):
+        key = (user_id, conversation_id)
+        future = self.pending.get(key)
+        if future is None:
+            return
+
+        def push(done: asyncio.Future):
+            if not done.cancelled() and done.result() and not generation.done:
+                generation.append_event({"alias": done.result()})
+
+        future.add_done_callback(push)
+
+alias_queue = AliasQueue(ALIAS_WORKERS, ALIAS_QUEUE_SIZE)
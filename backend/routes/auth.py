@@ -1,23 +1,23 @@
 import os
 import jwt
 import bcrypt
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, Cookie, Depends, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr, constr
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from cachetools import TTLCache
 from datetime import datetime
+from typing import Any, Dict, Optional
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+from .database import user_collection as collection
+from .metrics import increment, register_ratio
 
 load_dotenv()
 router = APIRouter()
 
-# Motor client 설정
-mongoclient = AsyncIOMotorClient(os.getenv('MONGODB_URI'))
-db = mongoclient.chat_db
-collection = db.users
-
 # JWT 설정
 AUTH_KEY = os.getenv('AUTH_KEY')
 ALGORITHM = 'HS256'
@@ -36,15 +36,70 @@ class User(BaseModel):
     user_id: str
     name: str
     email: str
-    billing: float
+    billing: Optional[float] = None
+
+# 사용자 캐시 (공유 백엔드가 필요하면 set_user_cache로 교체)
+class LocalUserCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._cache.get(user_id)
+
+    async def set(self, user_id: str, user: Dict[str, Any]):
+        self._cache[user_id] = user
+
+    async def delete(self, user_id: str):
+        self._cache.pop(user_id, None)
+
+user_cache = LocalUserCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('USER_CACHE_TTL', '60'))
+)
+register_ratio("user_cache_hit_ratio", "user_cache_hits", "user_cache_misses")
+
+def set_user_cache(backend):
+    global user_cache
+    user_cache = backend
+
+async def invalidate_user(user_id: str):
+    await user_cache.delete(user_id)
+
+# 비밀번호 해싱 설정 (이벤트 루프를 막지 않도록 전용 스레드 풀에서 실행)
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', '2'))
+PASSWORD_QUEUE_LIMIT = int(os.getenv('PASSWORD_QUEUE_LIMIT', '32'))
+
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+pending_password_jobs = 0
+
+async def run_password_job(func, *args):
+    global pending_password_jobs
+    if pending_password_jobs >= PASSWORD_QUEUE_LIMIT:
+        increment("password_jobs_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="요청이 많습니다. 잠시 후 다시 시도해 주세요."
+        )
+    pending_password_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        pending_password_jobs -= 1
 
 # 비밀번호 해싱 및 검증
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
+def needs_rehash(hashed_password: str) -> bool:
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 # 사용자 등록
 @router.post("/register")
 async def register(user: RegisterUser):
@@ -54,7 +109,7 @@ async def register(user: RegisterUser):
     new_user = {
         "name": user.name,
         "email": user.email,
-        "password": hash_password(user.password),
+        "password": await run_password_job(hash_password, user.password),
         "billing": 0.0,
         "created_at": datetime.utcnow()
     }
@@ -65,9 +120,15 @@ async def register(user: RegisterUser):
 @router.post("/login")
 async def login(user: LoginUser):
     db_user = await collection.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["password"]):
+    if not db_user or not await run_password_job(verify_password, user.password, db_user["password"]):
         raise HTTPException(status_code=401, detail="이메일 또는 비밀번호 오류입니다.")
     
+    if needs_rehash(db_user["password"]):
+        await collection.update_one(
+            {"_id": db_user["_id"]},
+            {"$set": {"password": await run_password_job(hash_password, user.password)}}
+        )
+    
     token = jwt.encode(
         {
             "user_id": str(db_user["_id"]),
@@ -116,9 +177,7 @@ async def get_auth_status(access_token: str = Cookie(None)):
     except (ExpiredSignatureError, InvalidTokenError):
         return {"logged_in": False, "error": "Invalid or expired token"}
 
-# 현재 사용자 가져오기
-@router.get("/auth/user")
-async def get_current_user(access_token: str = Cookie(None)) -> User:
+def decode_access_token(access_token: Optional[str]) -> Dict[str, Any]:
     if not access_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -126,13 +185,19 @@ async def get_current_user(access_token: str = Cookie(None)) -> User:
         )
     
     try:
-        payload = jwt.decode(access_token, AUTH_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
+        return jwt.decode(access_token, AUTH_KEY, algorithms=[ALGORITHM])
     except (ExpiredSignatureError, InvalidTokenError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+
+async def load_user(user_id: str) -> User:
+    cached = await user_cache.get(user_id)
+    if cached is not None:
+        increment("user_cache_hits")
+        return User(**cached)
+    increment("user_cache_misses")
     
     db_user = await collection.find_one({"_id": ObjectId(user_id)})
     if not db_user:
@@ -141,9 +206,26 @@ async def get_current_user(access_token: str = Cookie(None)) -> User:
             detail="User not found"
         )
     
-    return User(
+    user = User(
         user_id=str(db_user["_id"]),
         name=db_user["name"],
         email=db_user["email"],
         billing=db_user["billing"]
+    )
+    await user_cache.set(user_id, user.model_dump())
+    return user
+
+# 현재 사용자 가져오기
+@router.get("/auth/user")
+async def get_current_user(access_token: str = Cookie(None)) -> User:
+    payload = decode_access_token(access_token)
+    return await load_user(payload.get("user_id"))
+
+# billing이 필요 없는 요청은 JWT 클레임만으로 처리
+async def get_current_user_claims(access_token: str = Cookie(None)) -> User:
+    payload = decode_access_token(access_token)
+    return User(
+        user_id=payload.get("user_id"),
+        name=payload.get("name"),
+        email=payload.get("email")
     )
\ No newline at end of file
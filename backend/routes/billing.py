@@ -0,0 +1,198 @@
+import os
+import asyncio
+import tiktoken
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from .database import add_billing_bulk
+from .auth import invalidate_user
+from .metrics import increment, register_ratio
+
+IMAGE_TOKENS = 1000
+MESSAGE_OVERHEAD = 4
+
+# 인코더는 프로세스당 한 번만 로드
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base"):
+    return tiktoken.get_encoding(name)
+
+def count_text_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+@lru_cache(maxsize=256)
+def count_prompt_tokens(text: str) -> int:
+    return MESSAGE_OVERHEAD + count_text_tokens(text)
+
+# 저장 형식(text/file/image 파트)의 메시지 토큰 수
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    tokens = MESSAGE_OVERHEAD + count_text_tokens(message.get("role", ""))
+    content = message.get("content", "")
+    if isinstance(content, list):
+        texts = []
+        for part in content:
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "file":
+                texts.append(part.get("content") or "")
+            elif part.get("type") == "image":
+                tokens += IMAGE_TOKENS
+        content = "\n".join(texts)
+    return tokens + count_text_tokens(content)
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    tokens = message.get("tokens")
+    return tokens if tokens is not None else count_message_tokens(message)
+
+def count_input_tokens(prompts: List[str], messages: List[Dict[str, Any]]) -> int:
+    total = sum(count_prompt_tokens(prompt) for prompt in prompts if prompt)
+    return total + sum(message_tokens(message) for message in messages)
+
+# 캐시 읽기/쓰기 토큰은 input_tokens에 포함되며 배율만 다르게 적용
+def calculate_billing(input_tokens: int, output_tokens: int, in_billing_rate: float, out_billing_rate: float, search_billing_rate: Optional[float] = None,
+                      cache_read_tokens: int = 0, cache_write_tokens: int = 0, cache_read_multiplier: float = 1.0, cache_write_multiplier: float = 1.0) -> float:
+    uncached_tokens = input_tokens - cache_read_tokens - cache_write_tokens
+    weighted_input = uncached_tokens + cache_read_tokens * cache_read_multiplier + cache_write_tokens * cache_write_multiplier
+    input_cost = weighted_input * (in_billing_rate / 1000000)
+    output_cost = output_tokens * (out_billing_rate / 1000000)
+
+    if search_billing_rate is not None:
+        total_tokens = input_tokens + output_tokens
+        search_cost = total_tokens * (search_billing_rate / 1000000)
+    else:
+        search_cost = 0
+    return input_cost + output_cost + search_cost
+
+# 제공자별 usage 읽기, 없는 값은 None
+# input_tokens는 캐시 읽기/쓰기 토큰을 포함한 전체 입력 토큰
+class Usage(NamedTuple):
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cache_read_tokens: Optional[int] = None
+    cache_write_tokens: Optional[int] = None
+
+def read_openai_usage(source: Any) -> Usage:
+    usage = getattr(source, "usage", None)
+    if not usage:
+        return Usage()
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) if details else None
+    return Usage(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None), cached_tokens)
+
+def read_anthropic_input(usage: Any) -> Usage:
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return Usage(usage.input_tokens + cache_read + cache_write, None, cache_read, cache_write)
+
+def read_anthropic_usage(source: Any) -> Usage:
+    event_type = getattr(source, "type", None)
+    if event_type == "message_start":
+        return read_anthropic_input(source.message.usage)
+    usage = getattr(source, "usage", None)
+    if not usage:
+        return Usage()
+    if event_type == "message_delta":
+        return Usage(output_tokens=usage.output_tokens)
+    return read_anthropic_input(usage)._replace(output_tokens=usage.output_tokens)
+
+USAGE_READERS: Dict[str, Callable[[Any], Usage]] = {
+    "openai": read_openai_usage,
+    "anthropic": read_anthropic_usage,
+}
+
+def register_usage_reader(provider: str, reader: Callable[[Any], Usage]):
+    USAGE_READERS[provider] = reader
+
+register_ratio("prompt_cache_hit_ratio", "prompt_cache_read_tokens", "prompt_uncached_tokens")
+
+# 한 턴의 토큰 집계: 제공자 usage 우선, 없으면 토크나이저 추정
+class TokenAccounting:
+    def __init__(self, provider: str, prompts: List[str], messages: List[Dict[str, Any]]):
+        self.reader = USAGE_READERS[provider]
+        self.prompts = prompts
+        self.messages = messages
+        self.input_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.streamed_tokens = 0
+
+    def add_output(self, text: str):
+        self.streamed_tokens += count_text_tokens(text)
+
+    def record(self, source: Any):
+        usage = self.reader(source)
+        if usage.input_tokens is not None:
+            self.input_tokens = usage.input_tokens
+        if usage.output_tokens is not None:
+            self.output_tokens = usage.output_tokens
+        if usage.cache_read_tokens is not None:
+            self.cache_read_tokens = usage.cache_read_tokens
+        if usage.cache_write_tokens is not None:
+            self.cache_write_tokens = usage.cache_write_tokens
+
+    async def totals(self) -> Tuple[int, int]:
+        input_tokens = self.input_tokens
+        if input_tokens is None:
+            input_tokens = await asyncio.to_thread(count_input_tokens, self.prompts, self.messages)
+        output_tokens = self.output_tokens if self.output_tokens is not None else self.streamed_tokens
+        return input_tokens, output_tokens
+
+    # 제공자가 보고한 입력에 대해서만 캐시 적중 지표 기록
+    def record_cache_metrics(self):
+        if self.input_tokens is None:
+            return
+        increment("prompt_cache_read_tokens", self.cache_read_tokens)
+        increment("prompt_cache_write_tokens", self.cache_write_tokens)
+        increment("prompt_uncached_tokens", self.input_tokens - self.cache_read_tokens)
+
+# 사용자별 요금을 모아 주기적으로 한 번의 $inc로 반영
+class BillingBatcher:
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.pending: Dict[str, float] = defaultdict(float)
+        self.task: Optional[asyncio.Task] = None
+        self.stopping = asyncio.Event()
+
+    def add(self, user_id: str, amount: float):
+        if amount:
+            self.pending[user_id] += amount
+
+    async def flush(self):
+        if not self.pending:
+            return
+        amounts, self.pending = self.pending, defaultdict(float)
+        try:
+            await add_billing_bulk(amounts)
+        except BaseException as ex:
+            # 실패하거나 취소된 금액은 다음 flush에서 다시 반영
+            for user_id, amount in amounts.items():
+                self.pending[user_id] += amount
+            if not isinstance(ex, Exception):
+                raise
+            print(f"Billing flush exception: {ex}", flush=True)
+            return
+        for user_id in amounts:
+            await invalidate_user(user_id)
+
+    # 진행 중인 쓰기를 취소하지 않도록 종료 신호를 받으면 루프를 빠져나옴
+    async def run(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self):
+        self.stopping.clear()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.stopping.set()
+        if self.task:
+            await asyncio.gather(self.task, return_exceptions=True)
+        await self.flush()
+
+billing_batcher = BillingBatcher(float(os.getenv('BILLING_FLUSH_INTERVAL', '5')))
@@ -0,0 +1,194 @@
+import asyncio
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from .auth import User, get_current_user_claims
+from .database import append_messages
+from .extraction import process_files
+from .images import warm_images
+from .streaming import coalesce
+from .generations import start_generation, open_generation, cancel_generation, generation_response
+from .metrics import increment
+from .aliases import alias_queue
+from .admission import user_limiter, get_lane, stream_with_retry
+from .failover import Route, plan_routes, race_routes
+from .model_registry import get_model_info
+from .response_cache import cache_eligible, response_cache_key, get_cached_response, store_cached_response, replay_chunks
+from .billing import calculate_billing, billing_batcher, TokenAccounting
+from .context import build_context, record_turn
+from .summary import schedule_summary
+from .prompts import DAN_PROMPT, MARKDOWN_PROMPT
+from .providers import ProviderAdapter, load_providers
+
+router = APIRouter()
+
+class ChatRequest(BaseModel):
+    conversation_id: str
+    model: str
+    in_billing: float
+    out_billing: float
+    search_billing: Optional[float] = None
+    temperature: float = 1.0
+    reason: int = 0
+    system_message: Optional[str] = None
+    user_message: List[Dict[str, Any]]
+    dan: bool = False
+    stream: bool = True
+    cache: bool = False
+
+# 별도 파트로 덧붙여 앞선 파트(프롬프트 캐시 접두사)는 그대로 유지
+def stay_in_character(message):
+    message["content"] = list(message["content"]) + [{"type": "text", "text": "STAY IN CHARACTER"}]
+
+# 모든 제공자가 공유하는 한 턴: 히스토리 로드 -> 스트리밍 중계 -> 과금/저장
+async def get_response(request: ChatRequest, adapter: ProviderAdapter, user: User) -> StreamingResponse:
+    processed_user_message = await process_files(request.user_message, user.user_id)
+    user_entry = {"role": "user", "content": processed_user_message}
+    # 고정 프롬프트를 앞에 두어 대화마다 바이트 단위로 같은 접두사 유지
+    prompts = [MARKDOWN_PROMPT, DAN_PROMPT if request.dan else "", request.system_message or ""]
+    prompt_messages, context = await build_context(user.user_id, request.conversation_id, request.model, prompts, user_entry)
+    prompts.append(context.summary_prompt)
+    accounting = TokenAccounting(adapter.usage_provider, prompts, prompt_messages)
+
+    await warm_images(prompt_messages, data_url=adapter.data_url)
+    formatted_messages = [adapter.format_message(m) for m in prompt_messages]
+
+    response_chunks: List[str] = []
+    cache_key: Optional[str] = None
+    cached: Optional[Dict[str, Any]] = None
+    routes = plan_routes(adapter, request.model, request.in_billing, request.out_billing, providers)
+    route = routes[0]
+    route_accounting: Dict[int, TokenAccounting] = {id(route): accounting}
+    routed = False
+    completed = False
+
+    async def finish_turn(response_text: str):
+        formatted_response = {"role": "assistant", "content": response_text or "\u200B", "tokens": accounting.streamed_tokens}
+        if cached is not None:
+            # 캐시 적중은 과금하지 않고 아낀 금액만 기록
+            increment("response_cache_saved_billing", calculate_billing(
+                cached["input_tokens"],
+                cached["output_tokens"],
+                request.in_billing,
+                request.out_billing,
+                request.search_billing
+            ))
+        elif routed:
+            # 실제로 응답한 경로의 토큰과 단가로만 과금
+            input_tokens, output_tokens = await accounting.totals()
+            billing_batcher.add(user.user_id, calculate_billing(
+                input_tokens,
+                output_tokens,
+                route.in_billing,
+                route.out_billing,
+                request.search_billing,
+                accounting.cache_read_tokens,
+                accounting.cache_write_tokens,
+                route.adapter.settings.cache_read_multiplier,
+                route.adapter.settings.cache_write_multiplier
+            ))
+            accounting.record_cache_metrics()
+            if cache_key and completed and response_text:
+                await store_cached_response(cache_key, response_text, input_tokens, output_tokens)
+        updated_at = await append_messages(user.user_id, request.conversation_id, [user_entry, formatted_response], {
+            "model": request.model,
+            "temperature": request.temperature,
+            "reason": request.reason,
+            "system_message": request.system_message
+        })
+        sums = record_turn(user.user_id, request.conversation_id, context.version, [user_entry["tokens"], formatted_response["tokens"]], updated_at)
+        schedule_summary(user.user_id, request.conversation_id, context.summary_upto, sums)
+
+    def route_parameters(candidate: Route, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        candidate_request = request if candidate.model == request.model else request.model_copy(update={"model": candidate.model})
+        parameters = candidate.adapter.build_parameters(candidate_request, [prompt for prompt in prompts if prompt], messages)
+        if request.dan and DAN_PROMPT:
+            stay_in_character(parameters["messages"][-1])
+        return parameters
+
+    # 대체 경로는 해당 제공자 형식으로 메시지를 다시 만들고 토큰 집계도 따로 함
+    async def open_route(candidate: Route):
+        if candidate is routes[0]:
+            candidate_parameters = parameters
+        else:
+            await warm_images(prompt_messages, data_url=candidate.adapter.data_url)
+            candidate_parameters = route_parameters(candidate, [candidate.adapter.format_message(m) for m in prompt_messages])
+            route_accounting[id(candidate)] = TokenAccounting(candidate.adapter.usage_provider, prompts, prompt_messages)
+        candidate_accounting = route_accounting[id(candidate)]
+        client = candidate.adapter.client()
+        return stream_with_retry(lambda: coalesce(candidate.adapter.stream(client, candidate_parameters, candidate_accounting)))
+
+    def choose_route(winner: Route):
+        nonlocal route, accounting, routed
+        route, accounting, routed = winner, route_accounting[id(winner)], True
+
+    parameters = route_parameters(route, formatted_messages)
+
+    async def relay():
+        nonlocal cache_key, cached, completed
+        if cache_eligible(request.temperature, request.cache):
+            cache_key = await asyncio.to_thread(response_cache_key, adapter.settings.name, parameters)
+            cached = await get_cached_response(cache_key)
+            if cached is not None:
+                for text in replay_chunks(cached["text"]):
+                    response_chunks.append(text)
+                    accounting.add_output(text)
+                    yield text
+                return
+        lane = get_lane(adapter.settings.name, request.model)
+        # 토큰 버킷이 없는 모델은 추정치도 필요 없음
+        async for position in lane.admit(user.user_id, context.input_tokens if lane.token_bucket else 0):
+            yield {"queue_position": position}
+        async for text in race_routes(routes, open_route, choose_route, get_model_info(request.model).hedge, request.stream):
+            response_chunks.append(text)
+            accounting.add_output(text)
+            yield text
+        completed = True
+
+    async def on_finish():
+        try:
+            await finish_turn("".join(response_chunks))
+        finally:
+            user_limiter.release(user.user_id)
+
+    user_limiter.acquire(user.user_id)
+    generation = start_generation(user.user_id, relay(), on_finish)
+    alias_queue.watch(user.user_id, request.conversation_id, generation)
+    return generation_response(generation)
+
+# 끊긴 스트림 이어받기: Last-Event-ID(또는 offset) 다음 이벤트부터 재전송
+@router.get("/stream/{generation_id}")
+async def resume_stream(
+    generation_id: str,
+    offset: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None),
+    user: User = Depends(get_current_user_claims)
+):
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else offset
+    generation = await open_generation(generation_id, user.user_id, after)
+    increment("stream_resumes")
+    return generation_response(generation, after)
+
+# 생성 중단 (프론트엔드 중단 버튼)
+@router.delete("/stream/{generation_id}")
+async def cancel_stream(generation_id: str, user: User = Depends(get_current_user_claims)):
+    await cancel_generation(generation_id, user.user_id)
+    increment("stream_cancels")
+    return {"message": "Generation cancelled", "generation_id": generation_id}
+
+# providers.json에 등록된 제공자마다 POST 라우트 생성
+providers = load_providers()
+
+def make_endpoint(adapter: ProviderAdapter):
+    async def endpoint(chat_request: ChatRequest, user: User = Depends(get_current_user_claims)):
+        return await get_response(chat_request, adapter, user)
+    return endpoint
+
+for name, adapter in providers.items():
+    router.add_api_route(
+        adapter.settings.endpoint or f"/{name}",
+        make_endpoint(adapter),
+        methods=["POST"],
+        name=f"{name}_endpoint"
+    )
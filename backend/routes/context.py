@@ -0,0 +1,124 @@
+import os
+import asyncio
+from bisect import bisect_left
+from itertools import accumulate
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from .database import load_context_state, load_token_counts, set_token_counts, load_message_range
+from .extraction import resolve_files
+from .billing import count_message_tokens, count_prompt_tokens, message_tokens
+from .model_registry import get_model_info
+
+load_dotenv()
+
+# 컨텍스트 예산 설정
+CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', '0'))
+CONTEXT_MARGIN_TOKENS = int(os.getenv('CONTEXT_MARGIN_TOKENS', '1024'))
+# 시작 위치를 이 단위로 올림해서 여러 턴 동안 같은 접두사 유지 (프롬프트 캐시)
+CONTEXT_STRIDE = max(1, int(os.getenv('CONTEXT_STRIDE', '8')))
+# 0보다 크면 최근 CONTEXT_FILE_TURNS개 이전 메시지의 첨부 파일은 앞부분만 보냄
+CONTEXT_FILE_SUMMARY_CHARS = int(os.getenv('CONTEXT_FILE_SUMMARY_CHARS', '0'))
+CONTEXT_FILE_TURNS = int(os.getenv('CONTEXT_FILE_TURNS', '4'))
+
+SUMMARY_HEADER = "이전 대화 요약:"
+
+# (user_id, conversation_id) -> ((메시지 수, updated_at), 누적 토큰 합 [0, t0, t0+t1, ...])
+prefix_cache = LRUCache(maxsize=int(os.getenv('CONTEXT_CACHE_SIZE', '4096')))
+
+def context_budget(model: str, prompts: List[str], user_tokens: int) -> int:
+    info = get_model_info(model)
+    budget = info.context_window - info.max_output_tokens - CONTEXT_MARGIN_TOKENS
+    if CONTEXT_MAX_TOKENS:
+        budget = min(budget, CONTEXT_MAX_TOKENS)
+    budget -= sum(count_prompt_tokens(prompt) for prompt in prompts if prompt)
+    return budget - user_tokens
+
+# 최신 메시지부터 예산 안에 들어가는 가장 앞의 시작 위치 (누적 합에서 이진 탐색)
+def select_start(sums: List[int], budget: int) -> int:
+    total = len(sums) - 1
+    start = bisect_left(sums, sums[-1] - max(budget, 0))
+    start = -(-start // CONTEXT_STRIDE) * CONTEXT_STRIDE
+    return min(start, total)
+
+class ContextInfo(NamedTuple):
+    version: Optional[Tuple[int, Any]]
+    summary_upto: int
+    summary_prompt: str
+    # 입장 제어용 입력 토큰 추정치 (누적합 기준, 다시 세지 않음)
+    input_tokens: int
+
+def format_summary(summary: Optional[Dict[str, Any]]) -> str:
+    return f"{SUMMARY_HEADER}\n{summary['text']}" if summary else ""
+
+async def load_prefix_sums(user_id: str, conversation_id: str) -> Tuple[Optional[Tuple[int, Any]], List[int], Optional[Dict[str, Any]]]:
+    state = await load_context_state(user_id, conversation_id)
+    if not state:
+        return None, [0], None
+    key = (user_id, conversation_id)
+    version = (state["total"], state.get("updated_at"))
+    summary = state.get("summary")
+    cached = prefix_cache.get(key)
+    if cached and cached[0] == version:
+        return version, cached[1], summary
+
+    counts = await load_token_counts(user_id, conversation_id)
+    if len(counts) != state["total"]:
+        # 토큰 수가 없거나 길이가 맞지 않는 예전 대화는 한 번 계산해서 저장
+        messages = await load_message_range(user_id, conversation_id, 0, state["total"])
+        counts = await asyncio.to_thread(lambda: [message_tokens(message) for message in messages])
+        await set_token_counts(user_id, conversation_id, counts)
+    sums = [0, *accumulate(counts)]
+    prefix_cache[key] = (version, sums)
+    return version, sums, summary
+
+# 이번 턴에 추가한 메시지를 캐시된 누적 합 뒤에 이어 붙임 (캐시가 없으면 None)
+def record_turn(user_id: str, conversation_id: str, version: Optional[Tuple[int, Any]], counts: List[int], updated_at) -> Optional[List[int]]:
+    key = (user_id, conversation_id)
+    cached = prefix_cache.get(key)
+    if version is None or not cached or cached[0] != version:
+        prefix_cache.pop(key, None)
+        return None
+    sums = cached[1]
+    for count in counts:
+        sums.append(sums[-1] + count)
+    prefix_cache[key] = ((version[0] + len(counts), updated_at), sums)
+    return sums
+
+def summarize_old_files(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if not CONTEXT_FILE_SUMMARY_CHARS:
+        return messages
+    cutoff = len(messages) - CONTEXT_FILE_TURNS
+    summarized = []
+    for idx, message in enumerate(messages):
+        content = message.get("content")
+        if idx < cutoff and isinstance(content, list) and any(part.get("type") == "file" for part in content):
+            content = [
+                {**part, "content": (part.get("content") or "")[:CONTEXT_FILE_SUMMARY_CHARS] + "\n...(생략)"}
+                if part.get("type") == "file" and len(part.get("content") or "") > CONTEXT_FILE_SUMMARY_CHARS else part
+                for part in content
+            ]
+            message = {**message, "content": content}
+        summarized.append(message)
+    return summarized
+
+# 새 사용자 메시지를 포함한 프롬프트용 메시지 목록과 ContextInfo 반환
+# 저장된 요약이 있으면 요약된 앞부분 대신 요약 프롬프트를 씀
+async def build_context(user_id: str, conversation_id: str, model: str, prompts: List[str], user_entry: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], ContextInfo]:
+    resolved_entry = (await resolve_files([user_entry], user_id))[0]
+    user_tokens, (version, sums, summary) = await asyncio.gather(
+        asyncio.to_thread(count_message_tokens, resolved_entry),
+        load_prefix_sums(user_id, conversation_id)
+    )
+    user_entry["tokens"] = user_tokens
+    resolved_entry = {**resolved_entry, "tokens": user_tokens}
+
+    total = len(sums) - 1
+    summary_prompt = format_summary(summary)
+    summary_upto = min(summary["upto"], total) if summary else 0
+    start = max(select_start(sums, context_budget(model, prompts + [summary_prompt], user_tokens)), summary_upto)
+    history = await load_message_range(user_id, conversation_id, start, total - start)
+    first_user = next((idx for idx, message in enumerate(history) if message.get("role") == "user"), len(history))
+    history = summarize_old_files(await resolve_files(history[first_user:], user_id))
+    input_tokens = sum(count_prompt_tokens(prompt) for prompt in prompts + [summary_prompt] if prompt) + sums[-1] - sums[start] + user_tokens
+    return history + [resolved_entry], ContextInfo(version, summary_upto, summary_prompt, input_tokens)
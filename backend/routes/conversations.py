@@ -1,23 +1,28 @@
-import os
 import uuid
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
-from .auth import User, get_current_user
-from .openai_client import get_alias
+from typing import Any, Dict, List, Optional
+from .auth import User, get_current_user_claims
+from .aliases import alias_queue
+from .extraction import load_file_text, format_file_text
+from .database import (
+    conversation_collection as conversations_collection,
+    DEFAULT_ALIAS,
+    find_conversation,
+    list_conversations,
+    load_message_window,
+    count_messages,
+    truncate_messages
+)
 
 load_dotenv()
 router = APIRouter()
 
-# Motor client 설정
-mongo_client = AsyncIOMotorClient(os.getenv('MONGODB_URI'))
-db = mongo_client.chat_db
-conversations_collection = db.conversations
-
 # Pydantic 모델
 class NewConversationRequest(BaseModel):
     user_message: str
@@ -29,76 +34,183 @@ class NewConversationRequest(BaseModel):
 class RenameRequest(BaseModel):
     alias: str
 
-async def update_aliases():
-    await conversations_collection.update_many(
-        {"alias": {"$exists": False}},
-        {"$set": {"alias": "제목 없음"}}
-    )
+def encode_cursor(doc) -> str:
+    return f"{doc['updated_at'].isoformat()}_{doc['_id']}"
+
+def decode_cursor(cursor: str):
+    try:
+        updated_at, last_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(updated_at), ObjectId(last_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# 파일 본문은 크기만 남기고 필요할 때 따로 가져오도록 함
+def omit_file_contents(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    stripped = []
+    for message in messages:
+        content = message.get("content")
+        if message.get("role") == "user" and isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get("type") == "file" and part.get("content"):
+                    parts.append({
+                        "type": "file",
+                        "name": part.get("name"),
+                        "size": len(part.get("content")),
+                        "omitted": True
+                    })
+                else:
+                    parts.append(part)
+            message = {**message, "content": parts}
+        stripped.append(message)
+    return stripped
 
 @router.get("/conversations", response_model=dict)
-async def get_conversations(current_user: User = Depends(get_current_user)):
-    await update_aliases()
+async def get_conversations(
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user_claims)
+):
     user_id = current_user.user_id
-    cursor = conversations_collection.find(
-        {"user_id": user_id},
-        {"_id": 1, "user_id": 1, "conversation_id": 1, "alias": 1}
+    cursor_doc = list_conversations(
+        user_id,
+        {"_id": 1, "user_id": 1, "conversation_id": 1, "alias": 1, "updated_at": 1},
+        limit,
+        decode_cursor(cursor) if cursor else None
     )
     conversations = []
-    async for doc in cursor:
+    last_doc = None
+    async for doc in cursor_doc:
         conversations.append({
             "_id": str(doc["_id"]),
             "user_id": doc["user_id"],
             "conversation_id": doc["conversation_id"],
-            "alias": doc["alias"]
+            "alias": doc.get("alias", DEFAULT_ALIAS)
         })
-    return {"conversations": conversations}
+        last_doc = doc
+    next_cursor = None
+    if limit is not None and len(conversations) == limit and last_doc.get("updated_at"):
+        next_cursor = encode_cursor(last_doc)
+    return {"conversations": conversations, "next_cursor": next_cursor}
 
 @router.get("/conversation/{conversation_id}", response_model=dict)
-async def get_conversation(conversation_id: str, current_user: User = Depends(get_current_user)):
+async def get_conversation(
+    conversation_id: str,
+    before: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    include_files: bool = True,
+    current_user: User = Depends(get_current_user_claims)
+):
     user_id = current_user.user_id
-    doc = await conversations_collection.find_one({"user_id": user_id, "conversation_id": conversation_id})
+    if limit is None and before is None:
+        doc = await find_conversation(user_id, conversation_id)
+        start = 0
+        total = len(doc.get("conversation", [])) if doc else 0
+    else:
+        doc, start, total = await load_message_window(user_id, conversation_id, before, limit or 50)
     if not doc:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    messages = doc.get("conversation", [])
+    if not include_files:
+        messages = omit_file_contents(messages)
     return {
         "conversation_id": doc["conversation_id"],
         "model": doc["model"],
         "temperature": doc["temperature"],
         "reason": doc["reason"],
         "system_message": doc["system_message"],
-        "messages": doc["conversation"]
+        "messages": messages,
+        "start": start,
+        "total": total
     }
 
+@router.get("/conversation/{conversation_id}/file/{message_index}/{part_index}", response_model=dict)
+async def get_conversation_file(
+    conversation_id: str,
+    message_index: int,
+    part_index: int,
+    current_user: User = Depends(get_current_user_claims)
+):
+    user_id = current_user.user_id
+    if message_index < 0 or part_index < 0:
+        raise HTTPException(status_code=400, detail="Index is out of range")
+    doc = await find_conversation(
+        user_id,
+        conversation_id,
+        {"_id": 0, "conversation": {"$slice": [message_index, 1]}}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    messages = doc.get("conversation", [])
+    content = messages[0].get("content") if messages else None
+    if not isinstance(content, list) or part_index >= len(content) or content[part_index].get("type") != "file":
+        raise HTTPException(status_code=404, detail="File not found")
+    part = content[part_index]
+    if part.get("file_id"):
+        return {
+            "name": part.get("name"),
+            "content": format_file_text(part.get("name", ""), await load_file_text(part["file_id"], user_id))
+        }
+    return {
+        "name": part.get("name"),
+        "content": part.get("content")
+    }
+
+# 기본 별칭으로 바로 만들고, 별칭은 백그라운드에서 생성해 채팅 스트림 또는 /alias로 전달
 @router.post("/new_conversation", response_model=dict)
-async def create_new_conversation(request_data: NewConversationRequest, current_user: User = Depends(get_current_user)):
-    alias = "제목 없음"
-    try:
-        alias = await get_alias(request_data.user_message)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Alias generation failed: {str(e)}")
+async def create_new_conversation(request_data: NewConversationRequest, current_user: User = Depends(get_current_user_claims)):
     conversation_id = str(uuid.uuid4())
     user_id = current_user.user_id
+    now = datetime.utcnow()
     new_conversation = {
         "user_id": user_id,
         "conversation_id": conversation_id,
-        "alias": alias,
+        "alias": DEFAULT_ALIAS,
+        "alias_pending": True,
         "model": request_data.model,
         "temperature": request_data.temperature,
         "reason": request_data.reason,
         "system_message": request_data.system_message,
-        "conversation": []
+        "conversation": [],
+        "created_at": now,
+        "updated_at": now
     }
     await conversations_collection.insert_one(new_conversation)
+    if not alias_queue.submit(user_id, conversation_id, request_data.user_message):
+        await conversations_collection.update_one(
+            {"user_id": user_id, "conversation_id": conversation_id},
+            {"$unset": {"alias_pending": ""}}
+        )
     return {
         "message": "New conversation created",
-        "alias": alias,
+        "alias": DEFAULT_ALIAS,
         "conversation_id": conversation_id
     }
 
+@router.get("/conversation/{conversation_id}/alias", response_model=dict)
+async def get_conversation_alias(
+    conversation_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: User = Depends(get_current_user_claims)
+):
+    user_id = current_user.user_id
+    alias = await alias_queue.wait(user_id, conversation_id, wait)
+    if alias is not None:
+        return {"conversation_id": conversation_id, "alias": alias, "pending": False}
+    doc = await find_conversation(user_id, conversation_id, {"alias": 1, "alias_pending": 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {
+        "conversation_id": conversation_id,
+        "alias": doc.get("alias", DEFAULT_ALIAS),
+        "pending": bool(doc.get("alias_pending"))
+    }
+
 @router.put("/conversation/{conversation_id}/rename", response_model=dict)
 async def rename_conversation(
     conversation_id: str,
     request: RenameRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_claims)
 ):
     user_id = current_user.user_id
     result = await conversations_collection.update_one(
@@ -107,6 +219,7 @@ async def rename_conversation(
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    alias_queue.forget(user_id, conversation_id)
     return {
         "message": "Conversation renamed successfully",
         "conversation_id": conversation_id,
@@ -114,7 +227,7 @@ async def rename_conversation(
     }
 
 @router.delete("/conversation/all", response_model=dict)
-async def delete_all_conversation(current_user: User = Depends(get_current_user)):
+async def delete_all_conversation(current_user: User = Depends(get_current_user_claims)):
     user_id = current_user.user_id
     result = await conversations_collection.delete_many({
         "user_id": user_id,
@@ -124,7 +237,7 @@ async def delete_all_conversation(current_user: User = Depends(get_current_user)
     return {"message": "Conversations deleted successfully"}
 
 @router.delete("/conversation/{conversation_id}", response_model=dict)
-async def delete_conversation(conversation_id: str, current_user: User = Depends(get_current_user)):
+async def delete_conversation(conversation_id: str, current_user: User = Depends(get_current_user_claims)):
     user_id = current_user.user_id
     result = await conversations_collection.delete_one({
         "user_id": user_id,
@@ -138,22 +251,17 @@ async def delete_conversation(conversation_id: str, current_user: User = Depends
 async def delete_messages_from_index(
     conversation_id: str,
     startIndex: int,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_claims)
 ):
     user_id = current_user.user_id
-    doc = await conversations_collection.find_one({"user_id": user_id, "conversation_id": conversation_id})
-    if doc is None:
+    count = await count_messages(user_id, conversation_id)
+    if count is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    messages = doc.get("conversation", [])
-    if startIndex < 0 or startIndex >= len(messages):
+    if startIndex < 0 or startIndex >= count:
         raise HTTPException(status_code=400, detail="startIndex is out of range")
     
-    new_messages = messages[:startIndex]
-    await conversations_collection.update_one(
-        {"_id": doc["_id"]},
-        {"$set": {"conversation": new_messages}}
-    )
+    await truncate_messages(user_id, conversation_id, startIndex)
     
     return {
         "message": "Conversation truncated successfully.",
@@ -0,0 +1,150 @@
+import os
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from typing import Any, Dict, List, Optional, Tuple
+
+load_dotenv()
+
+# Motor client 설정 (모든 라우터가 공유)
+mongo_client = AsyncIOMotorClient(os.getenv('MONGODB_URI'))
+db = mongo_client.chat_db
+user_collection = db.users
+conversation_collection = db.conversations
+
+DEFAULT_ALIAS = "제목 없음"
+
+async def find_conversation(user_id: str, conversation_id: str, projection: Optional[Dict[str, Any]] = None):
+    return await conversation_collection.find_one(
+        {"user_id": user_id, "conversation_id": conversation_id},
+        projection
+    )
+
+async def add_billing_bulk(amounts: Dict[str, float]):
+    await user_collection.bulk_write(
+        [UpdateOne({"_id": ObjectId(user_id)}, {"$inc": {"billing": amount}}) for user_id, amount in amounts.items()],
+        ordered=False
+    )
+
+# token_counts는 conversation과 같은 길이의 메시지별 토큰 수 배열
+# Mongo는 밀리초 단위로 저장하므로 반환하는 updated_at도 맞춰서 자름
+async def append_messages(user_id: str, conversation_id: str, messages: List[Dict[str, Any]], fields: Dict[str, Any]) -> datetime:
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    await conversation_collection.update_one(
+        {"user_id": user_id, "conversation_id": conversation_id},
+        {
+            "$push": {
+                "conversation": {"$each": messages},
+                "token_counts": {"$each": [message.get("tokens") or 0 for message in messages]}
+            },
+            "$set": {**fields, "updated_at": now},
+            "$setOnInsert": {"alias": DEFAULT_ALIAS, "created_at": now}
+        },
+        upsert=True
+    )
+    return now
+
+async def load_context_state(user_id: str, conversation_id: str) -> Optional[Dict[str, Any]]:
+    return await find_conversation(user_id, conversation_id, {
+        "_id": 0,
+        "updated_at": 1,
+        "summary": 1,
+        "total": {"$size": {"$ifNull": ["$conversation", []]}}
+    })
+
+# 요약은 앞쪽 메시지 [0, upto)를 대신함, 다른 작업이 먼저 갱신했으면 저장하지 않음
+async def set_summary(user_id: str, conversation_id: str, summary: Dict[str, Any], expected_upto: int) -> bool:
+    query: Dict[str, Any] = {"user_id": user_id, "conversation_id": conversation_id}
+    if expected_upto:
+        query["summary.upto"] = expected_upto
+    else:
+        query["summary"] = {"$exists": False}
+    result = await conversation_collection.update_one(query, {"$set": {"summary": summary}})
+    return result.modified_count == 1
+
+async def load_token_counts(user_id: str, conversation_id: str) -> List[int]:
+    doc = await find_conversation(user_id, conversation_id, {"_id": 0, "token_counts": 1})
+    return doc.get("token_counts", []) if doc else []
+
+async def set_token_counts(user_id: str, conversation_id: str, counts: List[int]):
+    await conversation_collection.update_one(
+        {"user_id": user_id, "conversation_id": conversation_id},
+        {"$set": {"token_counts": counts}}
+    )
+
+async def load_message_range(user_id: str, conversation_id: str, start: int, count: int) -> List[Dict[str, Any]]:
+    if count <= 0:
+        return []
+    doc = await find_conversation(user_id, conversation_id, {"conversation": {"$slice": [start, count]}})
+    return doc.get("conversation", []) if doc else []
+
+async def load_message_window(user_id: str, conversation_id: str, before: Optional[int], limit: int):
+    total = await count_messages(user_id, conversation_id)
+    if total is None:
+        return None, 0, 0
+    end = total if before is None else max(0, min(before, total))
+    start = max(0, end - limit)
+    if end == start:
+        doc = await find_conversation(user_id, conversation_id, {"conversation": 0})
+        doc["conversation"] = []
+    else:
+        doc = await find_conversation(user_id, conversation_id, {"conversation": {"$slice": [start, end - start]}})
+    return doc, start, total
+
+def list_conversations(user_id: str, projection: Dict[str, Any], limit: Optional[int] = None, cursor: Optional[Tuple[datetime, ObjectId]] = None):
+    query: Dict[str, Any] = {"user_id": user_id}
+    if limit is None:
+        return conversation_collection.find(query, projection)
+    if cursor is not None:
+        updated_at, last_id = cursor
+        query["$or"] = [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": last_id}}
+        ]
+    return conversation_collection.find(query, projection).sort(
+        [("updated_at", DESCENDING), ("_id", DESCENDING)]
+    ).limit(limit)
+
+async def count_messages(user_id: str, conversation_id: str) -> Optional[int]:
+    doc = await find_conversation(user_id, conversation_id, {"count": {"$size": {"$ifNull": ["$conversation", []]}}})
+    return doc["count"] if doc else None
+
+async def truncate_messages(user_id: str, conversation_id: str, length: int):
+    await conversation_collection.update_one(
+        {"user_id": user_id, "conversation_id": conversation_id},
+        {"$push": {
+            "conversation": {"$each": [], "$slice": length},
+            "token_counts": {"$each": [], "$slice": length}
+        }}
+    )
+    await conversation_collection.update_one(
+        {"user_id": user_id, "conversation_id": conversation_id, "summary.upto": {"$gt": length}},
+        {"$unset": {"summary": ""}}
+    )
+
+# 마이그레이션: 예전 문서에 기본값 채우기 (시작 시 한 번 실행)
+async def migrate_conversations():
+    await conversation_collection.update_many(
+        {"alias": {"$exists": False}},
+        {"$set": {"alias": DEFAULT_ALIAS}}
+    )
+    await conversation_collection.update_many(
+        {"$or": [{"conversation": {"$exists": False}}, {"conversation": None}]},
+        {"$set": {"conversation": []}}
+    )
+    await conversation_collection.update_many(
+        {"updated_at": {"$exists": False}},
+        [{"$set": {"updated_at": {"$toDate": "$_id"}}}]
+    )
+
+async def ensure_indexes():
+    await conversation_collection.create_index(
+        [("user_id", ASCENDING), ("conversation_id", ASCENDING)],
+        unique=True
+    )
+    await conversation_collection.create_index(
+        [("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]
+    )
@@ -0,0 +1,235 @@
+import os
+import base64
+import hashlib
+import asyncio
+import uuid
+import tempfile
+import multiprocessing
+from cachetools import LRUCache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile, status
+from typing import Any, Dict, List, Tuple
+from .database import db
+from .extractors import extract_document, extract_document_path
+from .metrics import increment, register_ratio
+
+load_dotenv()
+
+# 문서 추출 설정
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '2'))
+EXTRACTION_TIMEOUT = float(os.getenv('EXTRACTION_TIMEOUT', '60'))
+MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "files")
+os.makedirs(FILES_DIR, exist_ok=True)
+
+def new_extraction_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=EXTRACTION_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+extraction_executor = new_extraction_executor()
+
+# SHA-256 -> 추출 텍스트 (프로세스 내 LRU + 워커 간 공유용 Mongo 컬렉션)
+text_cache = LRUCache(maxsize=int(os.getenv('EXTRACTION_CACHE_SIZE', '256')))
+extracted_collection = db.extracted_files
+files_collection = db.files
+file_cache = LRUCache(maxsize=int(os.getenv('FILE_META_CACHE_SIZE', '1024')))
+in_flight: Dict[str, asyncio.Future] = {}
+register_ratio("extraction_cache_hit_ratio", "extraction_cache_hits", "extraction_cache_misses")
+
+def decode_data_url(data_url: str) -> Tuple[bytes, str]:
+    _, encoded = data_url.split(",", 1)
+    file_data = base64.b64decode(encoded)
+    return file_data, hashlib.sha256(file_data).hexdigest()
+
+# 시간 초과한 작업은 취소해도 워커 프로세스를 계속 점유하므로 워커를 종료하고 풀을 새로 만듦
+# ProcessPoolExecutor에 워커 종료 API가 없어 _processes를 직접 사용
+def recycle_extraction_executor(executor: ProcessPoolExecutor):
+    global extraction_executor
+    if executor is not extraction_executor:
+        return
+    extraction_executor = new_extraction_executor()
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+    increment("extraction_pool_recycles")
+
+async def run_extraction(func, source: Any, filename: str) -> str:
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = extraction_executor
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, func, source, filename),
+                timeout=EXTRACTION_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            print(f"Extraction timed out: {filename}")
+            recycle_extraction_executor(executor)
+            return ""
+        except BrokenProcessPool as e:
+            # 다른 작업의 시간 초과로 풀이 교체되면 새 풀에서 한 번 더 시도
+            if attempt == 0 and executor is not extraction_executor:
+                continue
+            print(f"Extraction error: {e}")
+            return ""
+        except Exception as e:
+            print(f"Extraction error: {e}")
+            return ""
+    return ""
+
+def check_file_size(size: int, filename: str):
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"파일이 너무 큽니다: {filename}"
+        )
+
+async def extract_text(file_data: bytes, digest: str, filename: str) -> str:
+    check_file_size(len(file_data), filename)
+    return await extract_cached(digest, filename, extract_document, file_data)
+
+async def extract_cached(digest: str, filename: str, func, source: Any) -> str:
+    cached = text_cache.get(digest)
+    if cached is not None:
+        increment("extraction_cache_hits")
+        return cached
+
+    if digest in in_flight:
+        increment("extraction_cache_hits")
+        return await asyncio.shield(in_flight[digest])
+
+    doc = await extracted_collection.find_one({"_id": digest})
+    if doc:
+        increment("extraction_cache_hits")
+        text_cache[digest] = doc["text"]
+        return doc["text"]
+
+    increment("extraction_cache_misses")
+    future = asyncio.get_running_loop().create_future()
+    in_flight[digest] = future
+    try:
+        text = await run_extraction(func, source, filename)
+        if text:
+            text_cache[digest] = text
+        future.set_result(text)
+    finally:
+        in_flight.pop(digest, None)
+        # 첫 요청이 취소돼도 같은 파일을 기다리던 요청에는 CancelledError 대신 빈 결과를 줌
+        if not future.done():
+            future.set_result("")
+
+    if text:
+        try:
+            await extracted_collection.update_one(
+                {"_id": digest},
+                {"$setOnInsert": {"text": text, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Extraction cache write error: {e}")
+    return text
+
+# 업로드된 파일 (file_id로 참조)
+async def get_file(file_id: str, user_id: str) -> Dict[str, Any]:
+    meta = file_cache.get(file_id)
+    if meta is None:
+        meta = await files_collection.find_one({"_id": file_id})
+        if meta:
+            file_cache[file_id] = meta
+    if not meta or meta["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="File not found")
+    return meta
+
+async def load_file_text(file_id: str, user_id: str) -> str:
+    meta = await get_file(file_id, user_id)
+    path = os.path.join(FILES_DIR, meta["stored_name"])
+    return await extract_cached(meta["sha256"], meta["name"], extract_document_path, path)
+
+# 업로드를 청크 단위로 디스크에 쓰면서 해시 계산 (같은 내용은 한 파일로 저장)
+def store_upload(source, filename: str) -> Tuple[str, str, int]:
+    _, ext = os.path.splitext(filename)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=FILES_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                check_file_size(size, filename)
+                digest.update(chunk)
+                out.write(chunk)
+        stored_name = digest.hexdigest() + ext.lower()
+        os.replace(tmp_path, os.path.join(FILES_DIR, stored_name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return stored_name, digest.hexdigest(), size
+
+async def save_file(upload: UploadFile, user_id: str) -> Dict[str, Any]:
+    name = upload.filename or "file"
+    stored_name, digest, size = await asyncio.to_thread(store_upload, upload.file, name)
+    meta = {
+        "_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "name": name,
+        "stored_name": stored_name,
+        "sha256": digest,
+        "size": size,
+        "created_at": datetime.utcnow()
+    }
+    await files_collection.insert_one(meta)
+    file_cache[meta["_id"]] = meta
+    await extract_cached(digest, name, extract_document_path, os.path.join(FILES_DIR, stored_name))
+    return meta
+
+def format_file_text(name: str, text: str) -> str:
+    return f"[[{name}]]\n{text}"
+
+async def process_files(parts: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+    async def process_part(part: Dict[str, Any]) -> Dict[str, Any]:
+        if part.get("type") != "file":
+            return part
+        if part.get("file_id"):
+            meta = await get_file(part["file_id"], user_id)
+            return {"type": "file", "name": meta["name"], "file_id": part["file_id"]}
+        file_data, digest = await asyncio.to_thread(decode_data_url, part.get("content"))
+        extracted_text = await extract_text(file_data, digest, part.get("name", ""))
+        return {
+            "type": "file",
+            "name": part.get("name"),
+            "content": format_file_text(part.get("name", ""), extracted_text)
+        }
+
+    return list(await asyncio.gather(*(process_part(part) for part in parts)))
+
+# 프롬프트용 사본: file_id 참조를 추출 텍스트로 채움 (저장된 메시지는 그대로)
+async def resolve_files(messages: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+    async def resolve_part(part: Dict[str, Any]) -> Dict[str, Any]:
+        if part.get("type") != "file" or not part.get("file_id") or part.get("content"):
+            return part
+        try:
+            text = await load_file_text(part["file_id"], user_id)
+        except HTTPException:
+            text = ""
+        return {**part, "content": format_file_text(part.get("name", ""), text)}
+
+    async def resolve_message(message: Dict[str, Any]) -> Dict[str, Any]:
+        content = message.get("content")
+        if message.get("role") != "user" or not isinstance(content, list):
+            return message
+        if not any(part.get("type") == "file" and part.get("file_id") for part in content):
+            return message
+        return {**message, "content": list(await asyncio.gather(*(resolve_part(part) for part in content)))}
+
+    return list(await asyncio.gather(*(resolve_message(message) for message in messages)))
+
+def shutdown_extraction():
+    extraction_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+# 프로세스 풀 워커에서 실행되는 문서 텍스트 추출 함수 (무거운 import는 워커 안에서만)
+def extract_pdf(file_data: bytes) -> str:
+    import pymupdf
+    with pymupdf.open(stream=file_data, filetype="pdf") as document:
+        return "".join(page.get_text() for page in document)
+
+def extract_with_textract(file_data: bytes, ext: str) -> str:
+    import textract
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+        tmp.write(file_data)
+        tmp.flush()
+        tmp_path = tmp.name
+
+    try:
+        extracted_bytes = textract.process(tmp_path)
+        return extracted_bytes.decode("utf-8", errors="ignore")
+    finally:
+        os.remove(tmp_path)
+
+def extract_document(file_data: bytes, filename: str) -> str:
+    _, ext = os.path.splitext(filename)
+    if ext.lower() == ".pdf":
+        try:
+            text = extract_pdf(file_data)
+            if text.strip():
+                return text
+        except Exception as e:
+            print(f"PyMuPDF error: {e}")
+
+    try:
+        return extract_with_textract(file_data, ext)
+    except Exception as e:
+        print(f"textract error: {e}")
+        return ""
+
+def extract_document_path(path: str, filename: str) -> str:
+    with open(path, "rb") as f:
+        return extract_document(f.read(), filename)
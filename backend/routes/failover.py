@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+from collections import defaultdict, deque
+from dotenv import load_dotenv
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+from .metrics import increment
+from .model_registry import get_model_info
+from .providers import ProviderAdapter
+
+load_dotenv()
+
+# 첫 토큰 제한 시간과 헤지 요청 설정 (헤지는 모델 레지스트리의 hedge로 켬)
+TTFT_DEADLINE = float(os.getenv('TTFT_DEADLINE', '60'))
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '1'))
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '5'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+
+class Route(NamedTuple):
+    adapter: ProviderAdapter
+    model: str
+    in_billing: float
+    out_billing: float
+
+# (provider, model) -> 최근 첫 토큰 시간 (초)
+ttft_samples: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=200))
+
+def route_key(route: Route) -> Tuple[str, str]:
+    return route.adapter.settings.name, route.model.split(':')[0]
+
+def hedge_delay(route: Route) -> float:
+    samples = sorted(ttft_samples[route_key(route)])
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    index = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))
+    return max(HEDGE_MIN_DELAY, samples[index])
+
+# 요청한 모델 다음에 레지스트리의 fallbacks 순서대로 시도
+def plan_routes(adapter: ProviderAdapter, model: str, in_billing: float, out_billing: float, providers: Dict[str, ProviderAdapter]) -> List[Route]:
+    routes = [Route(adapter, model, in_billing, out_billing)]
+    for fallback in get_model_info(model).fallbacks:
+        fallback_adapter = providers.get(fallback.provider)
+        if fallback_adapter is None:
+            continue
+        routes.append(Route(
+            fallback_adapter,
+            fallback.model or model,
+            fallback.in_billing if fallback.in_billing is not None else in_billing,
+            fallback.out_billing if fallback.out_billing is not None else out_billing
+        ))
+    return routes
+
+class Attempt:
+    def __init__(self, route: Route, open_stream: Callable[[Route], Awaitable[AsyncIterator[str]]]):
+        self.route = route
+        self.stream: Optional[AsyncIterator[str]] = None
+        self.started = time.monotonic()
+        self.deadline = self.started + (get_model_info(route.model).ttft_deadline or TTFT_DEADLINE)
+        self.first = asyncio.ensure_future(self.open(open_stream))
+
+    async def open(self, open_stream) -> str:
+        self.stream = await open_stream(self.route)
+        return await self.stream.__anext__()
+
+    async def close(self):
+        if not self.first.done():
+            self.first.cancel()
+            await asyncio.gather(self.first, return_exceptions=True)
+        if self.stream is not None:
+            await self.stream.aclose()
+
+# 첫 토큰을 먼저 낸 경로의 스트림만 이어서 전달하고 나머지는 취소
+# 첫 토큰 전에 실패하거나 제한 시간을 넘기면 다음 경로로 넘어가고, 헤지가 켜져 있으면 p95 지연 후 다음 경로를 동시에 시작
+# 제한 시간은 넘어갈 경로나 함께 도는 헤지 요청이 있을 때만 적용 (비스트리밍은 전체 응답을 기다리므로 적용 안 함)
+async def race_routes(
+    routes: List[Route],
+    open_stream: Callable[[Route], Awaitable[AsyncIterator[str]]],
+    on_winner: Callable[[Route], None],
+    hedge: bool = False,
+    deadline: bool = True
+) -> AsyncIterator[str]:
+    pending = list(routes)
+    attempts: List[Attempt] = []
+    hedged = False
+    last_error: Optional[BaseException] = None
+    winner: Optional[Attempt] = None
+    try:
+        while winner is None:
+            if not attempts:
+                if not pending:
+                    raise last_error or TimeoutError("No route produced a response")
+                if last_error is not None:
+                    increment("failovers")
+                attempts.append(Attempt(pending.pop(0), open_stream))
+
+            now = time.monotonic()
+            limited = deadline and (bool(pending) or len(attempts) > 1)
+            timeout = min(attempt.deadline for attempt in attempts) - now if limited else None
+            hedge_at = None
+            if hedge and not hedged and pending and len(attempts) == 1:
+                hedge_at = attempts[0].started + hedge_delay(attempts[0].route)
+                timeout = hedge_at - now if timeout is None else min(timeout, hedge_at - now)
+            await asyncio.wait([attempt.first for attempt in attempts], timeout=None if timeout is None else max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+
+            for attempt in list(attempts):
+                if not attempt.first.done():
+                    continue
+                error = attempt.first.exception()
+                if error is None or isinstance(error, StopAsyncIteration):
+                    winner = attempt
+                    break
+                print(f"Route {route_key(attempt.route)} failed: {error}", flush=True)
+                last_error = error
+                attempts.remove(attempt)
+                await attempt.close()
+            if winner is not None:
+                break
+
+            now = time.monotonic()
+            for attempt in list(attempts):
+                # 마지막으로 남은 시도는 제한 시간을 넘겨도 계속 기다림
+                if deadline and (pending or len(attempts) > 1) and now >= attempt.deadline:
+                    increment("ttft_timeouts")
+                    last_error = TimeoutError(f"No first token from {route_key(attempt.route)[0]} within deadline")
+                    attempts.remove(attempt)
+                    await attempt.close()
+            if hedge_at is not None and now >= hedge_at and pending and attempts:
+                hedged = True
+                increment("hedged_requests")
+                attempts.append(Attempt(pending.pop(0), open_stream))
+
+        attempts.remove(winner)
+        for attempt in attempts:
+            await attempt.close()
+        attempts = []
+        ttft_samples[route_key(winner.route)].append(time.monotonic() - winner.started)
+        if hedged and winner.route is not routes[0]:
+            increment("hedge_wins")
+        on_winner(winner.route)
+
+        if isinstance(winner.first.exception(), StopAsyncIteration):
+            return
+        yield winner.first.result()
+        async for text in winner.stream:
+            yield text
+    finally:
+        for attempt in attempts:
+            await attempt.close()
+        if winner is not None and winner.stream is not None:
+            await winner.stream.aclose()
@@ -0,0 +1,278 @@
+import os
+import json
+import uuid
+import asyncio
+from cachetools import TTLCache
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from .database import db
+from .streaming import sse_frame
+
+load_dotenv()
+
+# 생성 버퍼 설정
+GENERATION_BUFFER_CHARS = int(os.getenv('GENERATION_BUFFER_CHARS', str(1024 * 1024)))
+GENERATION_TTL = float(os.getenv('GENERATION_TTL', '900'))
+# 여러 워커에서 이어받기 위한 공유 로그: "memory"(워커 내부만, 기본) 또는 "mongo"(멀티 워커 배포에서 선택)
+GENERATION_LOG = os.getenv('GENERATION_LOG', 'memory').lower()
+GENERATION_LOG_INTERVAL = float(os.getenv('GENERATION_LOG_INTERVAL', '0.2'))
+GENERATION_LOG_MAX_CHUNKS = int(os.getenv('GENERATION_LOG_MAX_CHUNKS', '2000'))
+GENERATION_POLL_INTERVAL = float(os.getenv('GENERATION_POLL_INTERVAL', '0.25'))
+
+class GenerationExpired(Exception):
+    pass
+
+# 버퍼 항목은 응답 텍스트(str) 또는 별도 이벤트(dict, 예: {"alias": ...})
+Chunk = Union[str, Dict[str, Any]]
+
+def chunk_size(chunk: Chunk) -> int:
+    return len(json.dumps(chunk)) if isinstance(chunk, dict) else len(chunk)
+
+def chunk_payload(chunk: Chunk) -> Dict[str, Any]:
+    return chunk if isinstance(chunk, dict) else {"content": chunk}
+
+# 공유 로그: 청크는 {"s": 번호, "t": 텍스트}로 저장하고 최근 GENERATION_LOG_MAX_CHUNKS개만 유지
+class MongoGenerationLog:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def create(self, generation_id: str, user_id: str):
+        await self.collection.insert_one({
+            "_id": generation_id,
+            "user_id": user_id,
+            "chunks": [],
+            "next_seq": 1,
+            "done": False,
+            "error": None,
+            "expires_at": datetime.utcnow() + timedelta(seconds=GENERATION_TTL)
+        })
+
+    # 중단 요청 여부를 같은 쓰기에서 함께 돌려받음
+    async def append(self, generation_id: str, chunks: List[Tuple[int, Chunk]], next_seq: int) -> bool:
+        doc = await self.collection.find_one_and_update(
+            {"_id": generation_id},
+            {
+                "$push": {"chunks": {"$each": [{"s": seq, "t": text} for seq, text in chunks], "$slice": -GENERATION_LOG_MAX_CHUNKS}},
+                "$set": {"next_seq": next_seq}
+            },
+            projection={"cancelled": 1}
+        )
+        return bool(doc and doc.get("cancelled"))
+
+    async def cancelled(self, generation_id: str) -> bool:
+        doc = await self.collection.find_one({"_id": generation_id}, {"cancelled": 1})
+        return bool(doc and doc.get("cancelled"))
+
+    async def cancel(self, generation_id: str, user_id: str) -> bool:
+        result = await self.collection.update_one(
+            {"_id": generation_id, "user_id": user_id, "done": False},
+            {"$set": {"cancelled": True}}
+        )
+        return result.matched_count > 0
+
+    async def finish(self, generation_id: str, error: Optional[str]):
+        await self.collection.update_one({"_id": generation_id}, {"$set": {"done": True, "error": error}})
+
+    async def load(self, generation_id: str, after: int) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": generation_id}, {
+            "user_id": 1,
+            "next_seq": 1,
+            "done": 1,
+            "error": 1,
+            "count": {"$size": "$chunks"},
+            "chunks": {"$filter": {"input": "$chunks", "cond": {"$gt": ["$$this.s", after]}}}
+        })
+
+generation_log = MongoGenerationLog(db.generation_log) if GENERATION_LOG == "mongo" else None
+
+# HTTP 연결과 분리된 한 번의 응답 생성, 이벤트 번호는 1부터
+class Generation:
+    def __init__(self, generation_id: str, user_id: str):
+        self.id = generation_id
+        self.user_id = user_id
+        self.chunks: List[Chunk] = []
+        self.first_seq = 1
+        self.buffered_chars = 0
+        self.pending_log: List[Tuple[int, Chunk]] = []
+        self.done = False
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.updated = asyncio.Event()
+
+    @property
+    def next_seq(self) -> int:
+        return self.first_seq + len(self.chunks)
+
+    def notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def append(self, chunk: Chunk):
+        self.pending_log.append((self.next_seq, chunk))
+        self.chunks.append(chunk)
+        self.buffered_chars += chunk_size(chunk)
+        if self.buffered_chars > GENERATION_BUFFER_CHARS:
+            drop = 0
+            while self.buffered_chars > GENERATION_BUFFER_CHARS and drop < len(self.chunks) - 1:
+                self.buffered_chars -= chunk_size(self.chunks[drop])
+                drop += 1
+            del self.chunks[:drop]
+            self.first_seq += drop
+        self.notify()
+
+    def append_event(self, payload: Dict[str, Any]):
+        self.append(payload)
+
+    def finish(self, error: Optional[str] = None):
+        self.error = error
+        self.done = True
+        self.notify()
+
+    async def events(self, after: int) -> AsyncIterator[Tuple[int, Chunk]]:
+        while True:
+            updated = self.updated
+            if after + 1 < self.first_seq:
+                raise GenerationExpired()
+            for chunk in self.chunks[after + 1 - self.first_seq:]:
+                after += 1
+                yield after, chunk
+            if self.done:
+                return
+            await updated.wait()
+
+# 다른 워커가 만든 생성은 공유 로그를 폴링해서 전달
+class RemoteGeneration:
+    def __init__(self, doc: Dict[str, Any]):
+        self.id = doc["_id"]
+        self.user_id = doc["user_id"]
+        self.first_seq = doc["next_seq"] - doc["count"]
+        self.error: Optional[str] = None
+        self.doc: Optional[Dict[str, Any]] = doc
+
+    async def events(self, after: int) -> AsyncIterator[Tuple[int, Chunk]]:
+        while True:
+            doc = self.doc or await generation_log.load(self.id, after)
+            self.doc = None
+            if not doc:
+                raise GenerationExpired()
+            if after + 1 < doc["next_seq"] - doc["count"]:
+                raise GenerationExpired()
+            for chunk in doc["chunks"]:
+                if chunk["s"] > after:
+                    yield chunk["s"], chunk["t"]
+                    after = chunk["s"]
+            if doc["done"]:
+                self.error = doc.get("error")
+                return
+            await asyncio.sleep(GENERATION_POLL_INTERVAL)
+
+generations: TTLCache = TTLCache(maxsize=int(os.getenv('GENERATION_CACHE_SIZE', '4096')), ttl=GENERATION_TTL)
+generation_tasks: Set[asyncio.Task] = set()
+
+async def run_log(generation: Generation):
+    try:
+        await generation_log.create(generation.id, generation.user_id)
+        while True:
+            done = generation.done
+            if generation.pending_log:
+                chunks, generation.pending_log = generation.pending_log, []
+                cancelled = await generation_log.append(generation.id, chunks, chunks[-1][0] + 1)
+            else:
+                cancelled = not done and await generation_log.cancelled(generation.id)
+            if done:
+                await generation_log.finish(generation.id, generation.error)
+                return
+            # 다른 워커에서 받은 중단 요청
+            if cancelled and not generation.task.done():
+                generation.task.cancel()
+            await asyncio.sleep(GENERATION_LOG_INTERVAL)
+    except Exception as ex:
+        print(f"Generation log exception: {ex}", flush=True)
+
+async def run_generation(generation: Generation, source: AsyncIterator[str], on_finish: Callable[[], Awaitable[None]]):
+    error = None
+    try:
+        async for text in source:
+            generation.append(text)
+    except Exception as ex:
+        print(f"Exception detected: {ex}", flush=True)
+        error = str(ex)
+    finally:
+        try:
+            await asyncio.shield(on_finish())
+        finally:
+            generation.finish(error)
+            generations[generation.id] = generation
+
+def track(task: asyncio.Task):
+    generation_tasks.add(task)
+    task.add_done_callback(generation_tasks.discard)
+
+# 응답 생성을 백그라운드 태스크로 시작 (클라이언트 연결이 끊겨도 끝까지 생성하고 저장, 중단은 cancel_generation)
+def start_generation(user_id: str, source: AsyncIterator[str], on_finish: Callable[[], Awaitable[None]]) -> Generation:
+    generation = Generation(uuid.uuid4().hex, user_id)
+    generations[generation.id] = generation
+    generation.task = asyncio.create_task(run_generation(generation, source, on_finish))
+    track(generation.task)
+    if generation_log is not None:
+        track(asyncio.create_task(run_log(generation)))
+    return generation
+
+async def open_generation(generation_id: str, user_id: str, after: int):
+    generation = generations.get(generation_id)
+    if generation is None and generation_log is not None:
+        doc = await generation_log.load(generation_id, after)
+        if doc:
+            generation = RemoteGeneration(doc)
+    if generation is None or generation.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    if after + 1 < generation.first_seq:
+        raise HTTPException(status_code=410, detail="Generation buffer expired")
+    return generation
+
+# 생성 태스크를 취소: on_finish가 그때까지 생성한 부분만 과금하고 저장
+async def cancel_generation(generation_id: str, user_id: str):
+    generation = generations.get(generation_id)
+    if generation is not None:
+        if generation.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Generation not found")
+        if not generation.task.done():
+            generation.task.cancel()
+        return
+    if generation_log is None or not await generation_log.cancel(generation_id, user_id):
+        raise HTTPException(status_code=404, detail="Generation not found")
+
+# 각 청크에 SSE id(이벤트 번호)를 붙여서 Last-Event-ID로 이어받을 수 있게 함
+def generation_response(generation, after: int = 0) -> StreamingResponse:
+    async def event_generator():
+        if after == 0:
+            yield sse_frame({"generation_id": generation.id})
+        try:
+            async for seq, chunk in generation.events(after):
+                yield sse_frame(chunk_payload(chunk), seq)
+        except GenerationExpired:
+            yield sse_frame({"error": "Generation buffer expired"})
+            return
+        if generation.error:
+            yield sse_frame({"error": generation.error})
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"X-Generation-ID": generation.id}
+    )
+
+async def ensure_generation_indexes():
+    if generation_log is not None:
+        await generation_log.ensure_indexes()
+
+async def shutdown_generations():
+    for task in list(generation_tasks):
+        task.cancel()
+    await asyncio.gather(*generation_tasks, return_exceptions=True)
@@ -0,0 +1,38 @@
+import io
+from typing import Dict
+from PIL import Image, ImageOps
+
+MAX_DIMENSION = (1024, 1024)
+THUMBNAIL_DIMENSION = (256, 256)
+
+def encode(image: Image.Image, format: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+# 프로세스 풀 워커에서 실행: 업로드 이미지를 제공자용 JPEG, WebP, 썸네일로 변환
+def process_image(contents: bytes) -> Dict[str, bytes]:
+    image = Image.open(io.BytesIO(contents))
+    if image.format == "JPEG":
+        image.draft("RGB", MAX_DIMENSION)
+
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[3])
+        image = background
+    else:
+        image = image.convert("RGB")
+
+    image.thumbnail(MAX_DIMENSION, Image.Resampling.LANCZOS)
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_DIMENSION, Image.Resampling.LANCZOS)
+
+    return {
+        "jpeg": encode(image, "JPEG", quality=60, optimize=True),
+        "webp": encode(image, "WEBP", quality=70),
+        "thumb": encode(thumbnail, "JPEG", quality=70, optimize=True)
+    }
@@ -0,0 +1,191 @@
+import os
+import time
+import base64
+import hashlib
+import asyncio
+import threading
+import multiprocessing
+from cachetools import LRUCache
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile, status
+from fastapi.staticfiles import StaticFiles
+from typing import Any, Dict, List, Optional, Tuple
+from .metrics import increment, register_ratio
+from .image_processing import process_image
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+UPLOAD_DIR = os.path.join(BASE_DIR, "images")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# 공개 URL이 설정되어 있으면 base64 대신 이미지 URL을 제공자에 전달
+IMAGE_URL_BASE = os.getenv('IMAGE_URL_BASE', '').rstrip("/")
+
+# (경로, mtime, 형식) -> 인코딩된 페이로드 문자열, 총 크기(바이트) 기준으로 제한
+# LRUCache는 스레드 안전하지 않으므로 warm_images 스레드와 이벤트 루프 모두 락을 잡고 접근
+payload_cache = LRUCache(maxsize=int(os.getenv('IMAGE_CACHE_BYTES', str(256 * 1024 * 1024))), getsizeof=len)
+payload_lock = threading.Lock()
+register_ratio("image_cache_hit_ratio", "image_cache_hits", "image_cache_misses")
+
+def image_path(file_path: str) -> str:
+    return os.path.join(BASE_DIR, file_path.lstrip("/"))
+
+def payload_key(file_path: str, data_url: bool) -> Tuple[str, int, bool]:
+    abs_path = image_path(file_path)
+    return abs_path, os.stat(abs_path).st_mtime_ns, data_url
+
+def encode_image(file_path: str, ext: str, data_url: bool) -> str:
+    try:
+        key = payload_key(file_path, data_url)
+    except OSError:
+        return ""
+    with payload_lock:
+        cached = payload_cache.get(key)
+    if cached is not None:
+        increment("image_cache_hits")
+        return cached
+
+    increment("image_cache_misses")
+    try:
+        with open(key[0], "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("utf-8")
+    except OSError:
+        return ""
+    if data_url:
+        encoded = "data:image/" + ext + ";base64," + encoded
+    with payload_lock:
+        payload_cache[key] = encoded
+    return encoded
+
+def image_ext(part: Dict[str, Any]) -> str:
+    return (part.get("name") or "image.jpeg").split(".")[-1]
+
+def image_url(part: Dict[str, Any]) -> Optional[str]:
+    if not IMAGE_URL_BASE:
+        return None
+    return IMAGE_URL_BASE + "/" + part.get("content", "").lstrip("/")
+
+# 캐시에 없는 이미지는 스레드에서 미리 읽어 둠 (이벤트 루프에서 파일 I/O 방지)
+async def warm_images(messages: List[Dict[str, Any]], data_url: bool):
+    if IMAGE_URL_BASE:
+        return
+    parts = [
+        part for message in messages
+        if message.get("role") == "user" and isinstance(message.get("content"), list)
+        for part in message["content"] if part.get("type") == "image"
+    ]
+    if parts:
+        await asyncio.to_thread(lambda: [encode_image(part.get("content", ""), image_ext(part), data_url) for part in parts])
+
+# 업로드 이미지 처리 설정
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+IMAGE_QUEUE_LIMIT = int(os.getenv('IMAGE_QUEUE_LIMIT', '16'))
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', str(30 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+image_executor = ProcessPoolExecutor(
+    max_workers=IMAGE_WORKERS,
+    mp_context=multiprocessing.get_context("spawn")
+)
+pending_image_jobs = 0
+
+async def read_upload(file: UploadFile, limit: int) -> bytes:
+    contents = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        contents += chunk
+        if len(contents) > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="이미지 파일이 너무 큽니다."
+            )
+    return bytes(contents)
+
+async def convert_image(contents: bytes) -> Dict[str, bytes]:
+    global pending_image_jobs
+    if pending_image_jobs >= IMAGE_QUEUE_LIMIT:
+        increment("image_jobs_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="요청이 많습니다. 잠시 후 다시 시도해 주세요."
+        )
+    pending_image_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(image_executor, process_image, contents)
+    finally:
+        pending_image_jobs -= 1
+
+# 내용 해시 기반 저장소: images/ab/cd/<hash>.jpeg, <hash>.webp, <hash>_thumb.jpeg
+VARIANTS = {"jpeg": ".jpeg", "webp": ".webp", "thumb": "_thumb.jpeg"}
+
+def variant_paths(digest: str) -> Dict[str, str]:
+    shard = f"{digest[:2]}/{digest[2:4]}"
+    return {name: f"/images/{shard}/{digest}{suffix}" for name, suffix in VARIANTS.items()}
+
+def write_variants(paths: Dict[str, str], variants: Dict[str, bytes]):
+    for name, data in variants.items():
+        target = image_path(paths[name])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+
+# 같은 이미지를 다시 올리면 mtime을 갱신해 가비지 수집 유예 시간을 다시 시작 (하나라도 없으면 새로 저장)
+def touch_variants(paths: Dict[str, str]) -> bool:
+    try:
+        for path in paths.values():
+            os.utime(image_path(path))
+    except FileNotFoundError:
+        return False
+    return True
+
+async def store_image(contents: bytes) -> Dict[str, str]:
+    digest = hashlib.sha256(contents).hexdigest()
+    paths = variant_paths(digest)
+    if await asyncio.to_thread(touch_variants, paths):
+        increment("image_store_dedup_hits")
+        return paths
+    variants = await convert_image(contents)
+    await asyncio.to_thread(write_variants, paths, variants)
+    return paths
+
+# 내용 해시로 이름이 정해진 파일은 바뀌지 않으므로 장기 캐시
+class ImmutableStaticFiles(StaticFiles):
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+# 어떤 대화에서도 참조하지 않는 이미지 삭제 (grace_seconds 보다 오래된 파일만)
+async def collect_garbage(conversation_collection, grace_seconds: float = 24 * 60 * 60) -> int:
+    referenced = set()
+    cursor = conversation_collection.aggregate([
+        {"$unwind": "$conversation"},
+        {"$match": {"conversation.role": "user"}},
+        {"$unwind": "$conversation.content"},
+        {"$match": {"conversation.content.type": "image"}},
+        {"$group": {"_id": "$conversation.content.content"}}
+    ])
+    async for doc in cursor:
+        if doc["_id"]:
+            name = os.path.basename(doc["_id"])
+            referenced.add(name.split(".")[0].split("_")[0])
+
+    def sweep() -> int:
+        removed = 0
+        cutoff = time.time() - grace_seconds
+        for root, _, names in os.walk(UPLOAD_DIR):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.split(".")[0].split("_")[0] in referenced or os.path.getmtime(path) > cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
+
+    return await asyncio.to_thread(sweep)
+
+def shutdown_images():
+    image_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,75 @@
+import os
+import httpx
+import openai
+import anthropic
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from typing import Any, Dict, Optional, Tuple
+
+load_dotenv()
+
+# 연결 풀 설정
+MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '200'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '50'))
+KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60'))
+HTTP2 = os.getenv('LLM_HTTP2', 'false').lower() == 'true'
+
+# (SDK, base_url, api_key) -> SDK 클라이언트, 앱 전체에서 재사용
+# 같은 URL이라도 키(계정)가 다르면 연결과 한도를 따로 씀
+# 재시도는 admission.stream_with_retry에서만 하므로 SDK 자체 재시도는 끔
+clients: Dict[Tuple[str, str, str], Any] = {}
+
+def build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(300, connect=10)
+    )
+
+def get_openai_client(api_key: str, base_url: str = "") -> AsyncOpenAI:
+    key = ("openai", base_url, api_key)
+    client = clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(api_key=api_key, base_url=(base_url or None), max_retries=0, http_client=build_http_client())
+        clients[key] = client
+    return client
+
+def get_anthropic_client(api_key: str, base_url: str = "") -> anthropic.AsyncAnthropic:
+    key = ("anthropic", base_url, api_key)
+    client = clients.get(key)
+    if client is None:
+        client = anthropic.AsyncAnthropic(api_key=api_key, base_url=(base_url or None), max_retries=0, http_client=build_http_client())
+        clients[key] = client
+    return client
+
+# 자주 쓰는 클라이언트는 시작 시 미리 생성
+def init_clients():
+    if os.getenv('OPENAI_API_KEY'):
+        get_openai_client(os.getenv('OPENAI_API_KEY'))
+    if os.getenv('ANTHROPIC_API_KEY'):
+        get_anthropic_client(os.getenv('ANTHROPIC_API_KEY'))
+
+async def close_clients():
+    for client in clients.values():
+        await client.close()
+    clients.clear()
+
+# 재시도할 만한 제공자 오류: 연결/타임아웃, 429, 5xx, Anthropic 529(overloaded)
+TRANSIENT_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+def is_transient_error(ex: Exception) -> bool:
+    if isinstance(ex, (httpx.TransportError, openai.APIConnectionError, anthropic.APIConnectionError)):
+        return True
+    return getattr(ex, "status_code", None) in TRANSIENT_STATUS
+
+def retry_after(ex: Exception) -> Optional[float]:
+    response = getattr(ex, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
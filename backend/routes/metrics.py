@@ -0,0 +1,44 @@
+import os
+import secrets
+from collections import defaultdict
+from dotenv import load_dotenv
+from typing import Dict, Optional, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+load_dotenv()
+
+# 설정하지 않으면 /metrics를 열지 않음
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+router = APIRouter()
+
+counters: Dict[str, float] = defaultdict(float)
+
+# 이름: (적중 카운터, 미적중 카운터)
+ratios: Dict[str, Tuple[str, str]] = {}
+
+def increment(name: str, value: float = 1):
+    counters[name] += value
+
+def register_ratio(name: str, hit_counter: str, miss_counter: str):
+    ratios[name] = (hit_counter, miss_counter)
+
+# Authorization: Bearer <METRICS_TOKEN> 확인
+def verify_metrics_token(authorization: Optional[str] = Header(None)):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+@router.get("/metrics", dependencies=[Depends(verify_metrics_token)])
+async def get_metrics():
+    computed = {}
+    for name, (hit_counter, miss_counter) in ratios.items():
+        total = counters[hit_counter] + counters[miss_counter]
+        computed[name] = counters[hit_counter] / total if total else 0.0
+    return {"counters": dict(counters), "ratios": computed}
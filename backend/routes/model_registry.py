@@ -0,0 +1,43 @@
+import os
+import json
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from typing import List, Optional
+
+load_dotenv()
+
+MODELS_CONFIG = os.getenv('MODELS_CONFIG', os.path.join(os.path.dirname(__file__), '..', 'models.json'))
+
+# 대체 경로: providers.json의 제공자 이름 (다른 base_url도 별도 제공자로 등록), 모델과 단가는 생략 시 원래 값
+class Fallback(BaseModel):
+    provider: str
+    model: Optional[str] = None
+    in_billing: Optional[float] = None
+    out_billing: Optional[float] = None
+
+class ModelInfo(BaseModel):
+    context_window: int = 128000
+    max_output_tokens: int = 4096
+    # 제공자 요청 한도 (없으면 제한 없음), 워커마다 따로 적용
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    fallbacks: List[Fallback] = []
+    # 첫 토큰 제한 시간 (없으면 TTFT_DEADLINE), hedge가 켜져 있으면 p95 지연 후 대체 경로를 동시에 시도
+    ttft_deadline: Optional[float] = None
+    hedge: bool = False
+
+def load_models(path: str = MODELS_CONFIG):
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    default = ModelInfo(**config.get("default", {}))
+    models = {
+        name: ModelInfo(**{**default.model_dump(), **entry})
+        for name, entry in config.get("models", {}).items()
+    }
+    return default, models
+
+default_model, models = load_models()
+
+# "claude-3-7-sonnet-latest:1"처럼 프론트엔드 접미사가 붙은 이름도 허용
+def get_model_info(model: str) -> ModelInfo:
+    return models.get(model.split(':')[0], default_model)
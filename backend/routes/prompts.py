@@ -0,0 +1,15 @@
+import os
+
+PROMPT_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+def load_prompt(filename: str) -> str:
+    try:
+        with open(os.path.join(PROMPT_DIR, filename), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+DAN_PROMPT = load_prompt('dan_prompt.txt')
+MARKDOWN_PROMPT = load_prompt('markdown_prompt.txt')
+ALIAS_PROMPT = load_prompt('alias_prompt.txt')
+SUMMARY_PROMPT = load_prompt('summary_prompt.txt')
@@ -0,0 +1,76 @@
+import os
+import json
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+
+load_dotenv()
+
+PROVIDERS_CONFIG = os.getenv('PROVIDERS_CONFIG', os.path.join(os.path.dirname(__file__), '..', 'providers.json'))
+
+class ProviderSettings(BaseModel):
+    name: str
+    type: str
+    endpoint: Optional[str] = None
+    api_key_env: str
+    base_url: str = ""
+    admin_role: str = "system"
+    include_usage: bool = True
+    # 입력 단가 대비 캐시 읽기/쓰기 토큰 배율
+    cache_read_multiplier: float = 1.0
+    cache_write_multiplier: float = 1.0
+
+# 제공자별 차이(메시지 형식, 요청 파라미터, 스트림 해석)만 담는 어댑터
+# 히스토리, 파일, 스트리밍, 과금, 저장은 chat.py의 공통 코어가 처리
+class ProviderAdapter(ABC):
+    usage_provider = "openai"
+    data_url = True
+
+    def __init__(self, settings: ProviderSettings):
+        self.settings = settings
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return os.getenv(self.settings.api_key_env)
+
+    @abstractmethod
+    def client(self) -> Any:
+        ...
+
+    @abstractmethod
+    def format_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def build_parameters(self, request: Any, system_prompts: List[str], formatted_messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def stream(self, client: Any, parameters: Dict[str, Any], accounting: Any) -> AsyncIterator[str]:
+        ...
+
+# type -> 어댑터 클래스
+ADAPTER_TYPES: Dict[str, Type[ProviderAdapter]] = {}
+
+def register_adapter(provider_type: str, adapter_class: Type[ProviderAdapter]):
+    ADAPTER_TYPES[provider_type] = adapter_class
+
+# 기본 어댑터 등록 (어댑터 모듈이 이 모듈을 import하므로 함수 안에서 불러옴), 같은 type으로 먼저 등록한 어댑터가 우선
+def register_builtin_adapters():
+    from .openai_client import OpenAIAdapter
+    from .anthropic_client import AnthropicAdapter
+    ADAPTER_TYPES.setdefault("openai", OpenAIAdapter)
+    ADAPTER_TYPES.setdefault("anthropic", AnthropicAdapter)
+
+def load_providers(path: str = PROVIDERS_CONFIG) -> Dict[str, ProviderAdapter]:
+    register_builtin_adapters()
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    adapters = {}
+    for name, entry in config.items():
+        settings = ProviderSettings(name=name, **entry)
+        if settings.type not in ADAPTER_TYPES:
+            raise ValueError(f"Unknown provider type: {settings.type}")
+        adapters[name] = ADAPTER_TYPES[settings.type](settings)
+    return adapters
@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+from cachetools import TTLCache
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
+from .database import db
+from .streaming import MAX_FRAME_CHARS
+from .metrics import increment, register_ratio
+
+load_dotenv()
+
+# 응답 캐시 설정 (기본 비활성)
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_BYTES = int(os.getenv('RESPONSE_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# 키 -> {"text", "input_tokens", "output_tokens"} (프로세스 내 TTL 캐시 + 워커 간 공유용 Mongo 컬렉션)
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_BYTES, ttl=RESPONSE_CACHE_TTL, getsizeof=lambda entry: len(entry["text"]) + 64)
+cache_collection = db.response_cache
+register_ratio("response_cache_hit_ratio", "response_cache_hits", "response_cache_misses")
+
+# 요청에서 cache를 켰거나 temperature가 0이면 같은 요청은 같은 응답으로 봄
+def cache_eligible(temperature: float, requested: bool) -> bool:
+    return RESPONSE_CACHE_ENABLED and (requested or temperature == 0)
+
+# stream 여부는 응답 내용과 무관하므로 키에서 제외
+def response_cache_key(namespace: str, parameters: Dict[str, Any]) -> str:
+    canonical = {key: value for key, value in parameters.items() if key not in ("stream", "stream_options")}
+    encoded = json.dumps([namespace, canonical], sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+async def get_cached_response(key: str) -> Optional[Dict[str, Any]]:
+    entry = response_cache.get(key)
+    if entry is None:
+        doc = await cache_collection.find_one({"_id": key})
+        if doc:
+            entry = {"text": doc["text"], "input_tokens": doc.get("input_tokens", 0), "output_tokens": doc.get("output_tokens", 0)}
+            response_cache[key] = entry
+    increment("response_cache_hits" if entry else "response_cache_misses")
+    return entry
+
+async def store_cached_response(key: str, text: str, input_tokens: int = 0, output_tokens: int = 0):
+    entry = {"text": text, "input_tokens": input_tokens, "output_tokens": output_tokens}
+    response_cache[key] = entry
+    try:
+        await cache_collection.update_one(
+            {"_id": key},
+            {"$set": {**entry, "expires_at": datetime.utcnow() + timedelta(seconds=RESPONSE_CACHE_TTL)}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"Response cache write error: {e}")
+
+# 캐시된 응답은 지연 없이 최대 프레임 크기로 잘라서 전달
+def replay_chunks(text: str) -> List[str]:
+    return [text[idx:idx + MAX_FRAME_CHARS] for idx in range(0, len(text), MAX_FRAME_CHARS)]
+
+async def ensure_response_cache_indexes():
+    if RESPONSE_CACHE_ENABLED:
+        await cache_collection.create_index("expires_at", expireAfterSeconds=0)
@@ -0,0 +1,70 @@
+import os
+import json
+import asyncio
+from dotenv import load_dotenv
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+load_dotenv()
+
+# 작은 델타를 모아 보내는 최대 지연 시간 (초)
+COALESCE_WINDOW = float(os.getenv('SSE_COALESCE_MS', '20')) / 1000
+MAX_FRAME_CHARS = 2048
+
+def sse_frame(payload: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    if event_id is not None:
+        return f"id: {event_id}\ndata: {json.dumps(payload)}\n\n"
+    return f"data: {json.dumps(payload)}\n\n"
+
+# 제공자 스트림을 직접 순회하면서 window 안에 도착한 델타를 한 프레임으로 합침
+# 버퍼가 비어 있을 때는 추가 태스크 없이 바로 기다리고, 첫 토큰은 즉시 내보냄
+async def coalesce(source: AsyncIterator[str], window: float = COALESCE_WINDOW) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    buffered_chars = 0
+    deadline = 0.0
+    next_task = None
+    try:
+        while True:
+            if next_task is None and not buffer:
+                try:
+                    token = await source.__anext__()
+                except StopAsyncIteration:
+                    return
+            else:
+                if next_task is None:
+                    next_task = asyncio.ensure_future(source.__anext__())
+                if buffer:
+                    remaining = deadline - loop.time()
+                    if remaining > 0 and buffered_chars < MAX_FRAME_CHARS:
+                        await asyncio.wait((next_task,), timeout=remaining)
+                    if not next_task.done():
+                        yield "".join(buffer)
+                        buffer.clear()
+                        buffered_chars = 0
+                        deadline = loop.time() + window
+                        continue
+                else:
+                    await asyncio.wait((next_task,))
+                task, next_task = next_task, None
+                try:
+                    token = task.result()
+                except StopAsyncIteration:
+                    if buffer:
+                        yield "".join(buffer)
+                    return
+                except Exception:
+                    if buffer:
+                        yield "".join(buffer)
+                    raise
+
+            if not buffer and loop.time() >= deadline:
+                deadline = loop.time() + window
+                yield token
+                continue
+            buffer.append(token)
+            buffered_chars += len(token)
+    finally:
+        if next_task is not None and not next_task.done():
+            next_task.cancel()
+            await asyncio.gather(next_task, return_exceptions=True)
+        await source.aclose()
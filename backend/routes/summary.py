@@ -0,0 +1,93 @@
+import os
+import asyncio
+from bisect import bisect_left, bisect_right
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .database import load_message_range, set_summary
+from .billing import count_text_tokens
+from .context import CONTEXT_STRIDE, load_prefix_sums
+from .metrics import increment
+from .openai_client import get_summary
+
+load_dotenv()
+
+# 롤링 요약 설정 (기본 비활성)
+SUMMARY_ENABLED = os.getenv('SUMMARY_ENABLED', 'false').lower() == 'true'
+# 요약 이후 메시지가 이 토큰 수를 넘으면 요약 갱신
+SUMMARY_THRESHOLD_TOKENS = int(os.getenv('SUMMARY_THRESHOLD_TOKENS', '16000'))
+# 최근 메시지는 이만큼 원문으로 남김
+SUMMARY_KEEP_TOKENS = int(os.getenv('SUMMARY_KEEP_TOKENS', '6000'))
+# 요약 모델에 한 번에 보내는 새 대화 분량
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', '12000'))
+
+in_progress: Set[Tuple[str, str]] = set()
+summary_tasks: Set[asyncio.Task] = set()
+
+def render_transcript(messages: List[Dict[str, Any]]) -> str:
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            texts = []
+            for part in content:
+                if part.get("type") == "text":
+                    texts.append(part.get("text", ""))
+                elif part.get("type") == "file":
+                    texts.append(f"[파일: {part.get('name', '')}]")
+                elif part.get("type") == "image":
+                    texts.append("[이미지]")
+            content = "\n".join(texts)
+        lines.append(f"{message.get('role')}: {content}")
+    return "\n\n".join(lines)
+
+# 요약이 대신할 범위의 끝: 최근 SUMMARY_KEEP_TOKENS만 남기고 컨텍스트 시작 단위에 맞춤
+def summary_target(sums: List[int]) -> int:
+    target = bisect_left(sums, sums[-1] - SUMMARY_KEEP_TOKENS)
+    return target // CONTEXT_STRIDE * CONTEXT_STRIDE
+
+# 기존 요약에 새로 밀려난 메시지만 덧붙여 다시 요약 (처음부터 다시 만들지 않음)
+async def summarize_conversation(user_id: str, conversation_id: str):
+    _, sums, summary = await load_prefix_sums(user_id, conversation_id)
+    upto = summary["upto"] if summary else 0
+    text = summary["text"] if summary else ""
+    target = summary_target(sums)
+    while upto < target:
+        end = max(upto + 1, min(target, bisect_right(sums, sums[upto] + SUMMARY_CHUNK_TOKENS) - 1))
+        messages = await load_message_range(user_id, conversation_id, upto, end - upto)
+        text = await get_summary(text, render_transcript(messages))
+        saved = await set_summary(user_id, conversation_id, {
+            "text": text,
+            "upto": end,
+            "tokens": count_text_tokens(text)
+        }, upto)
+        if not saved:
+            return
+        increment("summaries_generated")
+        upto = end
+
+def schedule_summary(user_id: str, conversation_id: str, summary_upto: int, sums: Optional[List[int]]):
+    if not SUMMARY_ENABLED or sums is None:
+        return
+    if sums[-1] - sums[min(summary_upto, len(sums) - 1)] <= SUMMARY_THRESHOLD_TOKENS:
+        return
+    key = (user_id, conversation_id)
+    if key in in_progress:
+        return
+    in_progress.add(key)
+
+    async def run():
+        try:
+            await summarize_conversation(user_id, conversation_id)
+        except Exception as ex:
+            print(f"Summary exception: {ex}", flush=True)
+        finally:
+            in_progress.discard(key)
+
+    task = asyncio.create_task(run())
+    summary_tasks.add(task)
+    task.add_done_callback(summary_tasks.discard)
+
+async def shutdown_summaries():
+    for task in list(summary_tasks):
+        task.cancel()
+    await asyncio.gather(*summary_tasks, return_exceptions=True)
@@ -0,0 +1,89 @@
+import json
+import asyncio
+import httpx
+import anthropic
+from openai import AsyncOpenAI
+from types import SimpleNamespace
+from bench.mock_provider import build_app
+from routes.anthropic_client import AnthropicAdapter
+from routes.openai_client import OpenAIAdapter
+from routes.providers import ProviderSettings
+from routes.billing import TokenAccounting
+
+# 로컬 가짜 제공자(bench.mock_provider)로 실제 SDK가 보내는 요청 본문을 받아 캐시 브레이크포인트 위치 확인
+PROMPTS = ["markdown prompt", "system message"]
+REQUEST = SimpleNamespace(model="claude-3-7-sonnet-latest", temperature=1.0, reason=0, stream=True)
+
+def user(index):
+    return {"role": "user", "content": [{"type": "text", "text": f"question {index}"}]}
+
+def history(turns):
+    messages = []
+    for index in range(turns):
+        messages += [user(index), {"role": "assistant", "content": f"answer {index}"}]
+    return messages
+
+def run_turns(adapter, make_client, turns):
+    app = build_app(tokens=3)
+
+    async def run():
+        http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        client = make_client(http_client)
+        for messages in turns:
+            parameters = adapter.build_parameters(REQUEST, PROMPTS, [adapter.format_message(m) for m in messages])
+            accounting = TokenAccounting(adapter.usage_provider, PROMPTS, messages)
+            assert "".join([text async for text in adapter.stream(client, parameters, accounting)]) == "tok0 tok1 tok2 "
+        await http_client.aclose()
+
+    asyncio.run(run())
+    return app.state.requests
+
+def anthropic_turns(turns):
+    adapter = AnthropicAdapter(ProviderSettings(name="claude", type="anthropic", api_key_env="ANTHROPIC_API_KEY"))
+    return run_turns(adapter, lambda http_client: anthropic.AsyncAnthropic(api_key="test", base_url="http://mock", http_client=http_client), turns)
+
+def openai_turns(turns):
+    adapter = OpenAIAdapter(ProviderSettings(name="gpt", type="openai", api_key_env="OPENAI_API_KEY"))
+    return run_turns(adapter, lambda http_client: AsyncOpenAI(api_key="test", base_url="http://mock/v1", http_client=http_client), turns)
+
+def marked(message):
+    return [part for part in message["content"] if isinstance(part, dict) and "cache_control" in part]
+
+def strip_cache_control(messages):
+    return [
+        message if isinstance(message["content"], str)
+        else {**message, "content": [{k: v for k, v in part.items() if k != "cache_control"} for part in message["content"]]}
+        for message in messages
+    ]
+
+def test_anthropic_breakpoints_are_deterministic():
+    messages = history(3) + [user(3)]
+    first, second = anthropic_turns([messages, messages])
+    assert first == second
+
+    body = json.loads(first)
+    assert body["system"] == [{"type": "text", "text": "\n\n".join(PROMPTS), "cache_control": {"type": "ephemeral"}}]
+    positions = [index for index, message in enumerate(body["messages"]) if marked(message)]
+    assert positions == [len(messages) - 3, len(messages) - 1]
+    assert all(len(marked(body["messages"][index])) == 1 for index in positions)
+    assert marked(body["messages"][-1])[0] is body["messages"][-1]["content"][-1]
+
+def test_anthropic_next_turn_reads_previous_breakpoint():
+    turn1 = history(2) + [user(2)]
+    turn2 = turn1 + [{"role": "assistant", "content": "answer 2"}, user(3)]
+    first, second = (json.loads(raw) for raw in anthropic_turns([turn1, turn2]))
+
+    # 이전 턴이 캐시를 기록한 위치(마지막 메시지)에 이번 턴의 읽기 브레이크포인트가 오고, 그 앞 접두사는 같아야 함
+    assert first["system"] == second["system"]
+    assert marked(first["messages"][-1])
+    assert marked(second["messages"][len(turn1) - 1])
+    assert strip_cache_control(second["messages"][:len(turn1)]) == strip_cache_control(first["messages"])
+
+def test_openai_prefix_is_byte_stable():
+    turn1 = history(2) + [user(2)]
+    turn2 = turn1 + [{"role": "assistant", "content": "answer 2"}, user(3)]
+    first, second = (json.loads(raw) for raw in openai_turns([turn1, turn2]))
+
+    assert [message["role"] for message in first["messages"][:len(PROMPTS)]] == ["system"] * len(PROMPTS)
+    prefix = json.dumps(first["messages"], ensure_ascii=False)[:-1]
+    assert json.dumps(second["messages"], ensure_ascii=False).startswith(prefix)
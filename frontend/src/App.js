@@ -33,6 +33,33 @@ function App() {
     ]);
   };
 
+  const updateConversationAlias = useCallback((conversation_id, alias) => {
+    setConversations((prevConversations) =>
+      prevConversations.map((conv) =>
+        conv.conversation_id === conversation_id ? { ...conv, alias } : conv
+      )
+    );
+  }, []);
+
+  // 별칭은 서버에서 백그라운드로 생성되므로 완료될 때까지 기다렸다가 반영
+  const fetchConversationAlias = useCallback(async (conversation_id) => {
+    for (let attempt = 0; attempt < 3; attempt++) {
+      try {
+        const response = await axios.get(
+          `${process.env.REACT_APP_FASTAPI_URL}/conversation/${conversation_id}/alias`,
+          { params: { wait: 10 }, withCredentials: true }
+        );
+        if (!response.data.pending) {
+          updateConversationAlias(conversation_id, response.data.alias);
+          return;
+        }
+      } catch (error) {
+        return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  }, [updateConversationAlias]);
+
   const deleteConversation = (conversation_id) => {
     setConversations((prevConversations) =>
       prevConversations.filter(
@@ -110,6 +137,8 @@ function App() {
         deleteAllConversation={deleteAllConversation}
         fetchConversations={fetchConversations}
         addConversation={addConversation}
+        updateConversationAlias={updateConversationAlias}
+        fetchConversationAlias={fetchConversationAlias}
         setErrorModal={setErrorModal}
       />
     </Router>
@@ -126,6 +155,8 @@ function AppLayout({
   deleteConversation,
   deleteAllConversation,
   addConversation,
+  updateConversationAlias,
+  fetchConversationAlias,
   setErrorModal,
   fetchConversations,
 }) {
@@ -277,7 +308,11 @@ function AppLayout({
                 path="/"
                 element={
                   isLoggedIn ? (
-                    <Main addConversation={addConversation} isTouch={isTouch} />
+                    <Main
+                      addConversation={addConversation}
+                      fetchConversationAlias={fetchConversationAlias}
+                      isTouch={isTouch}
+                    />
                   ) : (
                     <Navigate to="/login" />
                   )
@@ -287,7 +322,11 @@ function AppLayout({
                 path="/chat/:conversation_id"
                 element={
                   isLoggedIn ? (
-                    <Chat fetchConversations={fetchConversations} isTouch={isTouch} />
+                    <Chat
+                      fetchConversations={fetchConversations}
+                      updateConversationAlias={updateConversationAlias}
+                      isTouch={isTouch}
+                    />
                   ) : (
                     <Navigate to="/login" />
                   )
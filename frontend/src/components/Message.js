@@ -45,7 +45,14 @@ function Message({ messageIndex, role, content, isComplete, onDelete, onRegenera
             } else if (item.type === "image") {
               return (
                 <div key={index} className="image-object">
-                  <img src={`${process.env.REACT_APP_FASTAPI_URL}${item.content}`} alt={item.file_name} />
+                  {/* 대화에는 썸네일을 보여주고 누르면 원본(1024px)을 엶 */}
+                  <a href={`${process.env.REACT_APP_FASTAPI_URL}${item.content}`} target="_blank" rel="noopener noreferrer">
+                    <img
+                      src={`${process.env.REACT_APP_FASTAPI_URL}${item.thumbnail || item.content}`}
+                      alt={item.file_name}
+                      loading="lazy"
+                    />
+                  </a>
                 </div>
               );
             }
@@ -14,7 +14,22 @@ import Message from "../components/Message";
 import Modal from "../components/Modal";
 import "../styles/Common.css";
 
-function Chat({ fetchConversations, isTouch }) {
+// SSE 이벤트 하나를 필드(id, data) 단위로 파싱
+function parseEvent(block) {
+  let id = null;
+  const data = [];
+  for (const line of block.split("\n")) {
+    const sep = line.indexOf(":");
+    const field = sep === -1 ? line : line.slice(0, sep);
+    let value = sep === -1 ? "" : line.slice(sep + 1);
+    if (value.startsWith(" ")) value = value.slice(1);
+    if (field === "id") id = value;
+    else if (field === "data") data.push(value);
+  }
+  return { id, data: data.length > 0 ? data.join("\n") : null };
+}
+
+function Chat({ fetchConversations, updateConversationAlias, isTouch }) {
   const { conversation_id } = useParams();
   const location = useLocation();
   const navigate = useNavigate();
@@ -38,6 +53,7 @@ function Chat({ fetchConversations, isTouch }) {
   const fileInputRef = useRef(null);
   const messagesEndRef = useRef(null);
   const abortControllerRef = useRef(null);
+  const generationIdRef = useRef(null);
   const thinkingIntervalRef = useRef(null);
 
   const {
@@ -89,16 +105,24 @@ function Chat({ fetchConversations, isTouch }) {
         if (data.error) {
           throw new Error(data.error);
         }
-        return { type: "image", name: data.file_name, content: data.file_path, id: getFileId(file) };
+        return { type: "image", name: data.file_name, content: data.file_path, thumbnail: data.thumbnail_path, id: getFileId(file) };
       } else {
-        return new Promise((resolve, reject) => {
-          const reader = new FileReader();
-          reader.onload = () =>
-            resolve({ type: "file", name: file.name, content: reader.result, id: getFileId(file) });
-          reader.onerror = () =>
-            reject(new Error(`파일 변환 중 오류가 발생했습니다: ${reader.error}`));
-          reader.readAsDataURL(file);
-        });
+        // 문서는 한 번만 올리고 이후에는 file_id로 참조
+        const formData = new FormData();
+        formData.append("file", file);
+        const res = await fetch(
+          `${process.env.REACT_APP_FASTAPI_URL}/files`,
+          {
+            method: "POST",
+            body: formData,
+            credentials: "include",
+          }
+        );
+        const data = await res.json();
+        if (!res.ok) {
+          throw new Error(data.detail || "파일 업로드에 실패했습니다.");
+        }
+        return { type: "file", name: data.file_name, file_id: data.file_id, id: getFileId(file) };
       }
     },
     [getFileId]
@@ -186,6 +210,23 @@ function Chat({ fetchConversations, isTouch }) {
     setMessages((prev) => [...prev, { role: "error", content: message }]);
   }, []);
 
+  // 서버에 생성 중단을 요청하면 그때까지의 응답이 저장되고 스트림이 끝남, 실패하면 연결만 끊음
+  const stopResponse = useCallback(async () => {
+    const generationId = generationIdRef.current;
+    if (generationId) {
+      try {
+        const res = await fetch(
+          `${process.env.REACT_APP_FASTAPI_URL}/stream/${generationId}`,
+          { method: "DELETE", credentials: "include" }
+        );
+        if (res.ok) return;
+      } catch (err) {
+        console.error("중단 요청 실패:", err);
+      }
+    }
+    abortControllerRef.current?.abort();
+  }, []);
+
   const sendMessage = useCallback(
     async (message, files = uploadedFiles) => {
       if (!message.trim() && files.length === 0) return;
@@ -224,7 +265,7 @@ function Chat({ fetchConversations, isTouch }) {
           }, 1000);
         }
 
-        const response = await fetch(
+        let response = await fetch(
           `${process.env.REACT_APP_FASTAPI_URL}${selectedModel.endpoint}`,
           {
             method: "POST",
@@ -247,40 +288,70 @@ function Chat({ fetchConversations, isTouch }) {
           }
         );
 
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder("utf-8");
-        let partialData = "";
+        // 동시 응답 수 초과(429) 등으로 스트림이 열리지 않으면 서버의 detail을 보여줌
+        if (!response.ok) {
+          const data = await response.json().catch(() => ({}));
+          const detail = Array.isArray(data.detail)
+            ? data.detail.map((e) => e.msg).join(", ")
+            : data.detail;
+          setErrorMessage(detail || `서버 오류가 발생했습니다: ${response.status}`);
+          return;
+        }
+
+        generationIdRef.current = response.headers.get("X-Generation-ID");
         let assistantText = "";
+        let lastEventId = 0;
+        let resumeCount = 0;
 
         while (true) {
-          const { done, value } = await reader.read();
-          if (done) break;
-          const chunk = decoder.decode(value, { stream: true });
-          partialData += chunk;
-
-          const lines = partialData.split("\n\n");
-          for (let i = 0; i < lines.length - 1; i++) {
-            const line = lines[i];
-            if (line.startsWith("data: ")) {
-              const jsonData = line.replace("data: ", "");
-              try {
-                const data = JSON.parse(jsonData);
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder("utf-8");
+          let partialData = "";
+          try {
+            while (true) {
+              const { done, value } = await reader.read();
+              if (done) break;
+              partialData += decoder.decode(value, { stream: true });
+
+              const events = partialData.split("\n\n");
+              partialData = events.pop();
+              for (const event of events) {
+                const { id, data: jsonData } = parseEvent(event);
+                if (id) lastEventId = Number(id);
+                if (jsonData === null) continue;
+                let data;
+                try {
+                  data = JSON.parse(jsonData);
+                } catch (err) {
+                  setErrorMessage("스트리밍 중 오류가 발생했습니다: " + err.message);
+                  reader.cancel();
+                  return;
+                }
                 if (data.error) {
                   setErrorMessage("서버 오류가 발생했습니다: " + data.error);
                   reader.cancel();
                   return;
+                } else if (data.generation_id) {
+                  generationIdRef.current = data.generation_id;
+                } else if (data.alias) {
+                  updateConversationAlias(conversation_id, data.alias);
                 } else if (data.content) {
                   assistantText += data.content;
                   updateAssistantMessage(assistantText, false);
                 }
-              } catch (err) {
-                setErrorMessage("스트리밍 중 오류가 발생했습니다: " + err.message);
-                reader.cancel();
-                return;
               }
             }
+            break;
+          } catch (err) {
+            // 연결이 끊기면 마지막으로 받은 이벤트 다음부터 이어받기
+            if (err.name === "AbortError" || !generationIdRef.current || resumeCount >= 3) throw err;
+            resumeCount++;
+            response = await fetch(
+              `${process.env.REACT_APP_FASTAPI_URL}/stream/${generationIdRef.current}?offset=${lastEventId}`,
+              { credentials: "include", signal: controller.signal }
+            );
+            if (!response.ok) throw err;
           }
-          partialData = lines[lines.length - 1];
         }
         updateAssistantMessage(assistantText, true);
       } catch (err) {
@@ -294,6 +365,7 @@ function Chat({ fetchConversations, isTouch }) {
         }
         setIsLoadingResponse(false);
         abortControllerRef.current = null;
+        generationIdRef.current = null;
       }
     },
     [
@@ -304,6 +376,7 @@ function Chat({ fetchConversations, isTouch }) {
       reason,
       systemMessage,
       updateAssistantMessage,
+      updateConversationAlias,
       setErrorMessage,
       isInference,
       isDAN,
@@ -795,7 +868,7 @@ function Chat({ fetchConversations, isTouch }) {
           className="send-button"
           onClick={() => {
             if (isLoadingResponse) {
-              abortControllerRef.current?.abort();
+              stopResponse();
             } else {
               sendMessage(inputText);
             }
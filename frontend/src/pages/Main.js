@@ -20,7 +20,7 @@ import modelsData from "../models.json";
 import "../styles/Common.css";
 import { ClipLoader } from "react-spinners";
 
-function Main({ addConversation, isTouch }) {
+function Main({ addConversation, fetchConversationAlias, isTouch }) {
   const navigate = useNavigate();
   const location = useLocation();
   const [inputText, setInputText] = useState("");
@@ -121,22 +121,31 @@ function Main({ addConversation, isTouch }) {
           type: "image",
           name: data.file_name,
           content: data.file_path,
+          thumbnail: data.thumbnail_path,
           id: getFileId(file),
         };
       } else {
-        return new Promise((resolve, reject) => {
-          const reader = new FileReader();
-          reader.onload = () =>
-            resolve({
-              type: "file",
-              name: file.name,
-              content: reader.result,
-              id: getFileId(file),
-            });
-          reader.onerror = () =>
-            reject(new Error(`파일 변환 중 오류가 발생했습니다: ${reader.error}`));
-          reader.readAsDataURL(file);
-        });
+        // 문서는 한 번만 올리고 이후에는 file_id로 참조
+        const formData = new FormData();
+        formData.append("file", file);
+        const res = await fetch(
+          `${process.env.REACT_APP_FASTAPI_URL}/files`,
+          {
+            method: "POST",
+            body: formData,
+            credentials: "include",
+          }
+        );
+        const data = await res.json();
+        if (!res.ok) {
+          throw new Error(data.detail || "파일 업로드에 실패했습니다.");
+        }
+        return {
+          type: "file",
+          name: data.file_name,
+          file_id: data.file_id,
+          id: getFileId(file),
+        };
       }
     },
     [getFileId]
@@ -215,6 +224,7 @@ function Main({ addConversation, isTouch }) {
         const { conversation_id, alias } = response.data;
         const newConversation = { conversation_id, alias };
         addConversation(newConversation);
+        fetchConversationAlias(conversation_id);
         navigate(`/chat/${conversation_id}`, {
           state: {
             initialMessage: message,
@@ -237,6 +247,7 @@ function Main({ addConversation, isTouch }) {
       systemMessage,
       navigate,
       addConversation,
+      fetchConversationAlias,
       uploadedFiles,
     ]
   );